@@ -0,0 +1,43 @@
+"""
+Domain events for the stock and report write paths.
+
+Write code calls dispatch() explicitly where something happened instead of relying on model
+signals, so a plain save() pays for nothing. An event can have two kinds of handler:
+
+* invariants run synchronously inside the caller's transaction. They enforce what the write
+  cannot be committed without (stock checks, deductions) and raise to roll it back.
+* follow-ups run once the transaction commits, one call per dispatch with the whole batch.
+  They do the work nothing waits for: audit rows, rollups, cache invalidation, notifications.
+  A failing follow-up is logged by Django and does not stop the others.
+
+Payloads are keyword arguments and carry lists, so one dispatch covers a whole set of rows.
+Handlers register from each app's handlers module, imported in AppConfig.ready().
+"""
+from collections import defaultdict
+from functools import partial
+
+from django.db import transaction
+
+_invariants = defaultdict(list)
+_follow_ups = defaultdict(list)
+
+
+def invariant(event):
+    def register(handler):
+        _invariants[event].append(handler)
+        return handler
+    return register
+
+
+def follow_up(event):
+    def register(handler):
+        _follow_ups[event].append(handler)
+        return handler
+    return register
+
+
+def dispatch(event, **payload):
+    for handler in _invariants[event]:
+        handler(**payload)
+    for handler in _follow_ups[event]:
+        transaction.on_commit(partial(handler, **payload), robust=True)
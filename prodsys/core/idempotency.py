@@ -0,0 +1,120 @@
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils.timezone import now
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+# request bodies above this size (file uploads) are fingerprinted by length instead of content
+FINGERPRINT_BODY_LIMIT = 1024 * 1024
+
+
+def key_ttl():
+    return timedelta(hours=getattr(settings, "IDEMPOTENCY_KEY_TTL_HOURS", 24))
+
+
+class IdempotencyKeyInUse(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "A request with this Idempotency-Key is still being processed."
+    default_code = "idempotency_key_in_use"
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "This Idempotency-Key was already used for a different request."
+    default_code = "idempotency_key_reused"
+
+
+class IdempotentReplay(Exception):
+    def __init__(self, response):
+        self.response = response
+
+
+def fingerprint(request):
+    digest = hashlib.sha256(f"{request.method} {request.get_full_path()}\n".encode())
+    length = int(request.META.get("CONTENT_LENGTH") or 0)
+    if length > FINGERPRINT_BODY_LIMIT or request.content_type.startswith("multipart/"):
+        digest.update(str(length).encode())
+    else:
+        digest.update(request.body)
+    return digest.hexdigest()
+
+
+def claim(user, key, signature):
+    """Insert the key as in flight; returns (record, created). An expired record is replaced."""
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(user=user, key=key, fingerprint=signature), True
+        except IntegrityError:
+            record = IdempotencyKey.objects.filter(user=user, key=key).first()
+            if record is None:
+                continue
+            if record.created_at >= now() - key_ttl():
+                return record, False
+            IdempotencyKey.objects.filter(pk=record.pk).delete()
+    raise IdempotencyKeyInUse()
+
+
+class IdempotentMixin:
+    """
+    Mutating calls that carry an Idempotency-Key header run once per user and key.
+    The first response is stored and a retry gets it back without running the action again;
+    a 5xx is not stored, so the retry runs for real.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.idempotency_record = None
+        key = request.headers.get(HEADER)
+        if not key or request.method in SAFE_METHODS:
+            return
+        if len(key) > 255:
+            raise ValidationError({HEADER: "Must be at most 255 characters."})
+
+        signature = fingerprint(request)
+        record, created = claim(request.user, key, signature)
+        if created:
+            self.idempotency_record = record
+            return
+        if record.fingerprint != signature:
+            raise IdempotencyKeyReused()
+        if record.status_code is None:
+            raise IdempotencyKeyInUse()
+        raise IdempotentReplay(Response(record.response, status=record.status_code, headers={"Idempotent-Replayed": "true"}))
+
+    def release_idempotency_key(self):
+        record = getattr(self, "idempotency_record", None)
+        self.idempotency_record = None
+        if record is not None:
+            record.delete()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, IdempotentReplay):
+            return exc.response
+        try:
+            return super().handle_exception(exc)
+        except Exception:
+            # unhandled errors become a 500, the key must not block the retry
+            self.release_idempotency_key()
+            raise
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        record = getattr(self, "idempotency_record", None)
+        if record is not None:
+            if response.status_code >= 500 or response.streaming or not isinstance(response, Response):
+                self.release_idempotency_key()
+            else:
+                self.idempotency_record = None
+                record.status_code = response.status_code
+                record.response = response.data
+                record.save(update_fields=["status_code", "response"])
+        return response
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from core.idempotency import key_ttl
+from core.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Delete stored Idempotency-Key responses older than IDEMPOTENCY_KEY_TTL_HOURS (24h by default)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=10000)
+
+    def handle(self, *args, **options):
+        cutoff = now() - key_ttl()
+        total = 0
+        # small batches keep each delete short on a busy table
+        while True:
+            ids = list(IdempotencyKey.objects.filter(created_at__lt=cutoff).values_list("pk", flat=True)[:options["batch_size"]])
+            if not ids:
+                break
+            total += IdempotencyKey.objects.filter(pk__in=ids).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f"Purged {total} idempotency keys"))
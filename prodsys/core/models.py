@@ -1,4 +1,6 @@
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
 # Custom user model
@@ -45,3 +47,21 @@ class User(AbstractUser):
     # Show username and role when printing
     def __str__(self):
         return f"{self.username} ({self.role})"
+
+
+# Stored first response of a mutating API call sent with an Idempotency-Key header
+class IdempotencyKey(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    key = models.CharField(max_length=255)
+    # sha256 of method, path and body, a reused key with a different request is refused
+    fingerprint = models.CharField(max_length=64)
+    # null while the first request is still running
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["user", "key"], name="core_idempotency_user_key")]
+
+    def __str__(self):
+        return f"{self.user_id}:{self.key} -> {self.status_code}"
@@ -1,5 +1,51 @@
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 
 class ChoiceFieldSerializer(serializers.Serializer):
     value = serializers.CharField()
     display = serializers.CharField()
+
+
+class DynamicFieldsMixin:
+    """
+    Lets read clients trim the top-level representation:
+    ?fields=id,code       only these fields
+    ?compact=1            nested fields listed in Meta.nested_fields become their primary keys,
+                          or are dropped when another field already carries that key
+    ?expand=item_detail   keep a nested field anyway
+    Nested serializers and write requests are left untouched.
+    """
+
+    def _is_root(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get("request")
+        if request is None or request.method not in SAFE_METHODS or not self._is_root():
+            return fields
+
+        params = request.query_params
+        wanted = {name.strip() for name in params.get("fields", "").split(",") if name.strip()}
+        expand = {name.strip() for name in params.get("expand", "").split(",") if name.strip()}
+
+        if params.get("compact", "").lower() in ("1", "true", "yes"):
+            for name in set(getattr(self.Meta, "nested_fields", [])) - expand:
+                nested = fields.get(name)
+                if nested is None:
+                    continue
+                # fields are not bound yet, an unset source is the field name
+                source = nested.source or name
+                if any((field.source or key) == source for key, field in fields.items() if key != name and not field.write_only):
+                    fields.pop(name)
+                    continue
+                many = isinstance(nested, serializers.ListSerializer)
+                fields[name] = serializers.PrimaryKeyRelatedField(source=None if source == name else source, many=many, read_only=True)
+        if wanted:
+            for name in list(fields):
+                if name not in wanted and name not in expand:
+                    fields.pop(name)
+        return fields
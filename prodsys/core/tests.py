@@ -1,3 +1,59 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+
+from inventory.models import InventoryItem, StockMovement
+
+from .idempotency import HEADER
+from .models import IdempotencyKey
+
+
+class IdempotencyKeyTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("admin", password="x", role="ADMIN")
+        self.client.force_authenticate(self.user)
+        self.item = InventoryItem.objects.create(code="IK-1", name="IK-1", category="RAW")
+
+    def stock_in(self, key, quantity="5"):
+        return self.client.post(
+            f"/api/inventory/items/{self.item.pk}/stock_in/", {"quantity": quantity}, format="json", headers={HEADER: key}
+        )
+
+    def test_retry_replays_the_first_response(self):
+        first = self.stock_in("retry-1")
+        retry = self.stock_in("retry-1")
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.headers["Idempotent-Replayed"], "true")
+        self.assertEqual(first.json()["available"], "5.00")
+        self.assertEqual(retry.json(), first.json())
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, Decimal("5"))
+        self.assertEqual(StockMovement.objects.filter(item=self.item).count(), 1)
+
+    def test_key_reused_for_another_request_is_refused(self):
+        self.stock_in("reuse-1")
+        response = self.stock_in("reuse-1", quantity="7")
+
+        self.assertEqual(response.status_code, 422)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, Decimal("5"))
+
+    def test_keys_are_per_user(self):
+        self.stock_in("shared-1")
+        other = get_user_model().objects.create_user("other", password="x", role="ADMIN")
+        self.client.force_authenticate(other)
+        response = self.stock_in("shared-1")
+
+        self.assertNotIn("Idempotent-Replayed", response.headers)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, Decimal("10"))
+        self.assertEqual(IdempotencyKey.objects.filter(key="shared-1").count(), 2)
+
+    def test_request_without_key_runs_every_time(self):
+        for _ in range(2):
+            self.client.post(f"/api/inventory/items/{self.item.pk}/stock_in/", {"quantity": "5"}, format="json")
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, Decimal("10"))
@@ -1,4 +1,7 @@
+from django import forms
 from django.contrib import admin
+from core import domain
+from .ledger import record_batch, balance_delta, check_quantity, LedgerError
 from .models import InventoryItem, StockMovement
 
 
@@ -14,10 +17,71 @@ class InventoryItemAdmin(admin.ModelAdmin):
     )
     list_filter = ("category",)
     search_fields = ("code", "description")
+    # stock moves through the ledger, add a StockMovement to change it
+    readonly_fields = ("quantity",)
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        domain.dispatch("inventory_items.changed", items=[obj.pk])
+
+    def delete_model(self, request, obj):
+        pk = obj.pk
+        super().delete_model(request, obj)
+        domain.dispatch("inventory_items.changed", items=[pk])
+
+    def delete_queryset(self, request, queryset):
+        pks = list(queryset.values_list("pk", flat=True))
+        super().delete_queryset(request, queryset)
+        domain.dispatch("inventory_items.changed", items=pks)
+
+
+class StockMovementForm(forms.ModelForm):
+    class Meta:
+        model = StockMovement
+        fields = ["item", "movement_type", "quantity", "unit_cost", "reference", "remarks"]
+
+    def clean(self):
+        # the ledger's own checks, up front, so a bad line is a form error instead of a failed save
+        data = super().clean()
+        item, movement_type, quantity = data.get("item"), data.get("movement_type"), data.get("quantity")
+        if item is None or movement_type is None or quantity is None:
+            return data
+        try:
+            check_quantity(movement_type, quantity)
+        except LedgerError as e:
+            raise forms.ValidationError({"quantity": str(e)})
+        if item.available + balance_delta(movement_type, quantity) < 0:
+            raise forms.ValidationError({"quantity": f"Insufficient stock for {item.code}: {item.available} available"})
+        return data
 
 
 @admin.register(StockMovement)
 class StockMovementAdmin(admin.ModelAdmin):
+    form = StockMovementForm
     list_display = ("item", "movement_type", "quantity", "reference", "timestamp")
     list_filter = ("movement_type", "timestamp")
     search_fields = ("item__code", "reference", "remarks")
+
+    # a logged row is history: changing or deleting it would not move the stock or cost layers it moved
+    def get_readonly_fields(self, request, obj=None):
+        if obj is None:
+            return ()
+        return [field.name for field in StockMovement._meta.fields]
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            return
+        # a new row goes through the ledger so the item balance moves with it
+        movements, errors = record_batch(
+            [{
+                "item": obj.item_id, "movement_type": obj.movement_type, "quantity": obj.quantity,
+                "unit_cost": obj.unit_cost, "reference": obj.reference, "remarks": obj.remarks,
+            }],
+            user=request.user,
+        )
+        if errors:
+            raise LedgerError(errors[0]["error"])
+        obj.pk, obj.timestamp = movements[0].pk, movements[0].timestamp
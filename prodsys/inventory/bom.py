@@ -0,0 +1,90 @@
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+
+from .models import BillOfMaterial, BomRequirement
+
+# deeper than any real product structure, stops a runaway walk if a cycle slipped into the table
+MAX_DEPTH = 50
+
+
+def _walk(start, column, target):
+    """Item ids reachable from start, one query per BOM level."""
+    seen = set()
+    frontier = set(start)
+    for _ in range(MAX_DEPTH):
+        if not frontier:
+            return seen
+        step = set(BillOfMaterial.objects.filter(**{column + "__in": frontier}).values_list(target, flat=True))
+        frontier = step - seen
+        seen |= step
+    raise ValidationError("Bill of material is nested deeper than %d levels" % MAX_DEPTH)
+
+
+def components_of(item_ids):
+    return _walk(item_ids, "finished_item", "raw_item")
+
+
+def used_in(item_ids):
+    return _walk(item_ids, "raw_item", "finished_item")
+
+
+def check_cycle(finished_id, raw_id):
+    if finished_id == raw_id:
+        raise ValidationError({"raw_item": "An item cannot be a component of itself"})
+    if finished_id in components_of([raw_id]):
+        raise ValidationError({"raw_item": "This line would make the bill of material circular"})
+
+
+def explode(item_ids):
+    """
+    Flattened per-unit requirements of every item in item_ids, down to items that have no BOM of their own.
+    Returns {item_id: {leaf_id: quantity per unit}}; an item without BOM lines maps to {}.
+    """
+    lines = defaultdict(list)
+    frontier = set(item_ids)
+    loaded = set()
+    for _ in range(MAX_DEPTH):
+        if not frontier:
+            break
+        rows = BillOfMaterial.objects.filter(finished_item__in=frontier).values_list("finished_item", "raw_item", "quantity_required")
+        loaded |= frontier
+        children = set()
+        for finished_id, raw_id, quantity in rows:
+            lines[finished_id].append((raw_id, quantity))
+            children.add(raw_id)
+        frontier = children - loaded
+
+    flat = {}
+
+    def flatten(item_id, path=()):
+        if item_id in flat:
+            return flat[item_id]
+        if item_id in path:
+            raise ValidationError("Bill of material is circular")
+        totals = defaultdict(int)
+        for raw_id, quantity in lines[item_id]:
+            if lines[raw_id]:
+                for leaf_id, per_unit in flatten(raw_id, path + (item_id,)).items():
+                    totals[leaf_id] += quantity * per_unit
+            else:
+                totals[raw_id] += quantity
+        flat[item_id] = dict(totals)
+        return flat[item_id]
+
+    return {item_id: flatten(item_id) for item_id in item_ids}
+
+
+def rebuild_requirements(item_ids):
+    """Recompute the cached requirements of item_ids and of every item built from them."""
+    affected = set(item_ids) | used_in(item_ids)
+    BomRequirement.objects.filter(finished_item__in=affected).delete()
+    BomRequirement.objects.bulk_create(
+        [
+            BomRequirement(finished_item_id=item_id, raw_item_id=leaf_id, quantity_per_unit=quantity)
+            for item_id, leaves in explode(affected).items()
+            for leaf_id, quantity in leaves.items()
+        ],
+        batch_size=1000,
+    )
+    return len(affected)
@@ -0,0 +1,198 @@
+import csv
+import io
+import json
+import zlib
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import ValidationError
+
+from core import domain
+from .models import InventoryItem
+from .serializers import InventoryItemImportSerializer
+
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+# master data only; quantity is moved through the ledger
+IMPORT_FIELDS = [
+    "code", "name", "category", "uom", "width", "length", "thickness",
+    "gsm", "weight", "description", "reorder_level",
+]
+EXPORT_FIELDS = IMPORT_FIELDS + ["quantity", "last_updated"]
+MAX_REPORTED_ERRORS = 1000
+
+
+def file_format(name, requested=None):
+    fmt = (requested or name.rsplit(".", 1)[-1]).lower()
+    if fmt in ("jsonl", "json"):
+        fmt = "ndjson"
+    if fmt not in FORMATS:
+        raise ValueError("Use a .csv or .ndjson file, or pass file_format=csv|ndjson")
+    return fmt
+
+
+def read_rows(binary, fmt):
+    """
+    Yield (line number, row dict) from an uploaded file without loading it into memory.
+    A line that cannot be parsed is yielded with the ValueError in place of the dict.
+    """
+    text = io.TextIOWrapper(binary, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            # blank cells mean "use the default", not an empty value
+            yield reader.line_num, {key.strip(): value for key, value in row.items() if key and value not in ("", None)}
+        return
+
+    for number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+            if not isinstance(row, dict):
+                raise ValueError("Each line must be a JSON object")
+        except ValueError as e:
+            yield number, ValueError(str(e))
+            continue
+        yield number, row
+
+
+def _upsert(valid):
+    """
+    One INSERT ... ON CONFLICT (code) DO UPDATE per set of columns the rows carry. A row that
+    leaves a column out keeps its stored value, it is not overwritten with the model default.
+    """
+    codes = [row["code"] for _, row in valid]
+    existing = set(InventoryItem.objects.filter(code__in=codes).values_list("code", flat=True))
+    groups = defaultdict(list)
+    for _, row in valid:
+        groups[frozenset(row)].append(InventoryItem(**row))
+    for columns, items in groups.items():
+        InventoryItem.objects.bulk_create(
+            items,
+            update_conflicts=True,
+            unique_fields=["code"],
+            update_fields=[name for name in IMPORT_FIELDS if name in columns and name != "code"] + ["last_updated"],
+        )
+    return len(codes) - len(existing), len(existing)
+
+
+def import_items(rows, batch_size=2000):
+    """
+    Validate and upsert InventoryItem rows on code, one transaction per batch.
+    Bad rows are reported and skipped; the rest of their batch is still written.
+    Returns {"created", "updated", "error_count", "errors"}.
+    """
+    result = {"created": 0, "updated": 0, "error_count": 0, "errors": []}
+
+    def fail(line, errors):
+        result["error_count"] += 1
+        if len(result["errors"]) < MAX_REPORTED_ERRORS:
+            result["errors"].append({"line": line, "errors": errors})
+
+    # one serializer per mode validates every row, building its fields per row costs more than the insert;
+    # a row for an existing code only updates the columns it carries, so it is validated partially
+    validator = InventoryItemImportSerializer()
+    updater = InventoryItemImportSerializer(partial=True)
+
+    def flush(batch):
+        valid = {}
+        codes = {line: str(row.get("code", "")).strip() for line, row in batch}
+        existing = set(InventoryItem.objects.filter(code__in=codes.values()).values_list("code", flat=True))
+        for line, row in batch:
+            try:
+                data = (updater if codes[line] in existing else validator).run_validation(row)
+            except ValidationError as e:
+                fail(line, e.detail)
+                continue
+            # a code repeated in one batch would hit the same row twice, the last one wins
+            valid[data["code"]] = (line, data)
+        if valid:
+            with transaction.atomic():
+                created, updated = _upsert(list(valid.values()))
+            result["created"] += created
+            result["updated"] += updated
+
+    batch = []
+    for line, row in rows:
+        if isinstance(row, Exception):
+            fail(line, {"non_field_errors": [str(row)]})
+            continue
+        batch.append((line, row))
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    flush(batch)
+
+    if result["created"] or result["updated"]:
+        # upserts do not return ids, None stands for any item
+        domain.dispatch("inventory_items.changed", items=None)
+    return result
+
+
+def gzip_stream(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def csv_stream(header, rows, chunk_rows=500):
+    """Yield CSV text in blocks of chunk_rows so the response stays small in memory."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for index, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if index % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def ndjson_stream(header, rows, chunk_rows=500):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(header, row)), cls=DjangoJSONEncoder))
+        if len(lines) == chunk_rows:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def streaming_response(request, chunks, **kwargs):
+    """
+    StreamingHttpResponse over a sync chunk generator that stays streamed under ASGI too.
+    The ASGI handler collects a sync iterator into a list before sending anything, so there the
+    chunks are pulled one at a time through sync_to_async, on the thread that runs the ORM.
+    """
+    if not isinstance(getattr(request, "_request", request), ASGIRequest):
+        return StreamingHttpResponse(chunks, **kwargs)
+
+    async def pull():
+        pending = iter(chunks)
+        while (chunk := await sync_to_async(next)(pending, None)) is not None:
+            yield chunk
+
+    return StreamingHttpResponse(pull(), **kwargs)
+
+
+def download(request, chunks, name, fmt):
+    """An attachment streamed from chunks, gzipped with ?gzip=1."""
+    filename = f"{name}.{fmt}"
+    content_type = FORMATS[fmt]
+    compress = request.query_params.get("gzip")
+    if compress and compress not in ("0", "false"):
+        chunks = gzip_stream(chunks)
+        filename += ".gz"
+        content_type = "application/gzip"
+    response = streaming_response(request, chunks, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
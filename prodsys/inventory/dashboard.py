@@ -0,0 +1,113 @@
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Sum, Q
+from django.utils.timezone import localdate
+
+from .models import InventoryItem, StockMovement, StockMovementRollup
+from .serializers import InventoryItemSerializer, StockMovementSerializer
+
+VERSION_KEY = "inventory:dashboard:version"
+# safety net only, writes invalidate the snapshot straight away
+SNAPSHOT_TIMEOUT = 300
+BUILD_LOCK_TIMEOUT = 30
+# how long a request waits for another one's build before building its own
+BUILD_WAIT_STEP = 0.05
+BUILD_WAIT_STEPS = 20
+
+
+def period_starts(today):
+    return {
+        "daily": today,
+        "weekly": today - timedelta(days=today.weekday()),
+        "monthly": today.replace(day=1),
+        "yearly": today.replace(month=1, day=1),
+    }
+
+
+def period_totals(starts):
+    """
+    Sum the movement rollups per movement type for several periods in one query.
+    Returns {movement_type: {"daily_quantity": .., "daily_count": .., ...}}.
+    """
+    aggregates = {}
+    for name, since in starts.items():
+        aggregates[name + "_quantity"] = Sum("total_quantity", filter=Q(date__gte=since))
+        aggregates[name + "_count"] = Sum("movement_count", filter=Q(date__gte=since))
+    rows = (
+        StockMovementRollup.objects.filter(date__gte=min(starts.values()))
+        .values("movement_type")
+        .annotate(**aggregates)
+        .order_by("movement_type")
+    )
+    return {row.pop("movement_type"): row for row in rows}
+
+
+def build_snapshot(today):
+    starts = period_starts(today)
+    periods = period_totals(starts)
+    low_items = InventoryItem.objects.filter(is_low_stock=True)
+    recent_moves = StockMovement.objects.select_related("item").order_by("-timestamp", "-id")[:10]
+
+    return {
+        "totals_by_category": list(
+            InventoryItem.objects.values("category").annotate(total_qty=Sum("quantity")).order_by("category")
+        ),
+        "low_stock_count": low_items.count(),
+        "low_stock_items": list(InventoryItemSerializer(low_items[:50], many=True).data),
+        "recent_movements": list(StockMovementSerializer(recent_moves, many=True).data),
+        "movement_totals": {
+            name: [
+                {"movement_type": movement_type, "total": totals[name + "_quantity"]}
+                for movement_type, totals in periods.items()
+                if totals[name + "_quantity"] is not None
+            ]
+            for name in starts
+        },
+        "movement_counts": {name: sum(totals[name + "_count"] or 0 for totals in periods.values()) for name in starts},
+    }
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def invalidate():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 1, None)
+
+
+def get_snapshot():
+    """
+    The dashboard payload shared by the JSON API and the HTML page, built once per data version.
+    While one request rebuilds it, the others wait briefly for that build and otherwise build
+    their own; an older version is never served.
+    """
+    today = localdate()
+    key = f"inventory:dashboard:{current_version()}:{today.isoformat()}"
+    snapshot = cache.get(key)
+    if snapshot is not None:
+        return snapshot
+
+    lock = key + ":building"
+    if not cache.add(lock, 1, BUILD_LOCK_TIMEOUT):
+        for _ in range(BUILD_WAIT_STEPS):
+            time.sleep(BUILD_WAIT_STEP)
+            snapshot = cache.get(key)
+            if snapshot is not None:
+                return snapshot
+        return build_snapshot(today)
+
+    try:
+        snapshot = build_snapshot(today)
+        cache.set(key, snapshot, SNAPSHOT_TIMEOUT)
+    finally:
+        cache.delete(lock)
+    return snapshot
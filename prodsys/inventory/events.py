@@ -0,0 +1,157 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+
+logger = logging.getLogger(__name__)
+
+# events buffered per connection before a slow client is dropped
+QUEUE_SIZE = 1000
+CHANNEL = "inventory_stock_movements"
+# events per NOTIFY, a payload has to stay under PostgreSQL's 8000 bytes
+NOTIFY_BATCH = 20
+LISTEN_TIMEOUT = 5
+LISTEN_RETRY = 1
+
+
+class Subscription:
+    """
+    One listening connection. items / categories narrow what it receives;
+    with neither set it receives every stock movement.
+    """
+
+    def __init__(self, loop, items=None, categories=None):
+        self.loop = loop
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.items = set(items or ())
+        self.categories = set(categories or ())
+        self.overflowed = False
+
+    def wants(self, event):
+        if not self.items and not self.categories:
+            return True
+        return event["item"] in self.items or event["category"] in self.categories
+
+    def offer(self, event):
+        # runs on the subscriber's event loop
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # the stream closes and the client resumes from its Last-Event-ID
+            self.overflowed = True
+
+
+class StockEventBroker:
+    """
+    Pub/sub for committed stock movements. Publishers are ordinary sync code; subscribers are
+    async streams that may sit on another thread's loop.
+    On PostgreSQL events travel through NOTIFY on CHANNEL and every process runs one listener
+    thread, so a stream sees movements committed by any worker. Other backends deliver inside
+    the publishing process only.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+        self._listener = None
+
+    def subscribe(self, items=None, categories=None):
+        subscription = Subscription(asyncio.get_running_loop(), items, categories)
+        with self._lock:
+            self._subscriptions.add(subscription)
+            if self._listener is None and connection.vendor == "postgresql":
+                self._listener = threading.Thread(target=self._listen, name="stock-event-listener", daemon=True)
+                self._listener.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, events):
+        if connection.vendor != "postgresql":
+            self.deliver(events)
+            return
+        with connection.cursor() as cursor:
+            for start in range(0, len(events), NOTIFY_BATCH):
+                cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, json.dumps(events[start:start + NOTIFY_BATCH])])
+
+    def deliver(self, events):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            for event in events:
+                if subscription.wants(event):
+                    try:
+                        subscription.loop.call_soon_threadsafe(subscription.offer, event)
+                    except RuntimeError:
+                        # loop already closed, the stream is gone
+                        self.unsubscribe(subscription)
+                        break
+
+    def drop_all(self):
+        # events may have been missed, close every stream so its client resumes from its Last-Event-ID
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(setattr, subscription, "overflowed", True)
+            except RuntimeError:
+                self.unsubscribe(subscription)
+
+    def _listen(self):
+        while True:
+            listener = connections.create_connection(DEFAULT_DB_ALIAS)
+            try:
+                listener.connect()
+                listener.set_autocommit(True)
+                raw = listener.connection
+                with raw.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANNEL}")
+                while True:
+                    for payload in self._wait(raw):
+                        self.deliver(json.loads(payload))
+            except Exception:
+                logger.exception("Stock event listener lost its connection")
+                self.drop_all()
+                time.sleep(LISTEN_RETRY)
+            finally:
+                listener.close()
+
+    @staticmethod
+    def _wait(raw):
+        """Payloads of the notifications that arrive within LISTEN_TIMEOUT seconds, for psycopg 3 or psycopg2."""
+        if hasattr(raw, "notifies") and callable(raw.notifies):
+            return [notify.payload for notify in raw.notifies(timeout=LISTEN_TIMEOUT, stop_after=NOTIFY_BATCH)]
+        if select.select([raw], [], [], LISTEN_TIMEOUT) != ([], [], []):
+            raw.poll()
+        payloads = [notify.payload for notify in raw.notifies]
+        raw.notifies.clear()
+        return payloads
+
+
+broker = StockEventBroker()
+
+
+def decimal_text(value):
+    return None if value is None else f"{value:.2f}"
+
+
+def movement_event(movement, category, balance=None):
+    return {
+        "id": movement.pk,
+        "item": movement.item_id,
+        "category": category,
+        "movement_type": movement.movement_type,
+        "quantity": decimal_text(movement.quantity),
+        "balance": decimal_text(balance),
+        "reference": movement.reference,
+        "timestamp": movement.timestamp.isoformat() if movement.timestamp else None,
+    }
+
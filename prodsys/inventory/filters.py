@@ -1,7 +1,47 @@
 import django_filters
-from django.db.models import Q, F
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import Q, F, Case, When, Value, FloatField
+from rest_framework import filters
 from .models import InventoryItem, StockMovement
 
+
+def prefix_query(terms):
+    # every term must match the start of a token: "bopp fil" -> 'bopp':* & 'fil':*
+    quoted = ["'" + term.replace("\\", "\\\\").replace("'", "''") + "':*" for term in terms]
+    return SearchQuery(" & ".join(quoted), search_type="raw", config="simple")
+
+
+def search_items(queryset, text):
+    """
+    Full-text prefix search over code, name and description through the GIN-indexed search_vector,
+    plus a code prefix match for scanned barcodes. Adds a rank annotation, exact code hits first.
+    """
+    terms = text.split()
+    if not terms:
+        return queryset
+    query = prefix_query(terms)
+    return queryset.filter(Q(search_vector=query) | Q(code__startswith=text.strip())).annotate(
+        rank=SearchRank(F("search_vector"), query)
+        + Case(
+            When(code=text.strip(), then=Value(2.0)),
+            When(code__startswith=text.strip(), then=Value(1.0)),
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+    )
+
+
+class InventorySearchFilter(filters.SearchFilter):
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        queryset = search_items(queryset, " ".join(terms))
+        # an explicit ?ordering= wins, otherwise best matches first
+        if not request.query_params.get("ordering"):
+            queryset = queryset.order_by("-rank", "code")
+        return queryset
+
 class InventoryItemFilter(django_filters.FilterSet):
     search = django_filters.CharFilter(method="filter_search")
     category = django_filters.CharFilter(field_name="category", lookup_expr="iexact")
@@ -13,17 +53,12 @@ class InventoryItemFilter(django_filters.FilterSet):
         fields = ["category", "supplier"]
 
     def filter_search(self, queryset, name, value):
-        search_val = value
-        qs = queryset
-        qs = qs.filter(
-            Q(code__icontains=search_val) | Q(description__icontains=search_val)
-        )
-        return qs
+        return search_items(queryset, value)
 
     def filter_low_stock(self, queryset, name, value: bool):
         qs = queryset
         if value is True:
-            qs = qs.filter(quantity__lte=F("reorder_level"))
+            qs = qs.filter(is_low_stock=True)
         else:
             qs = qs
         return qs
@@ -31,7 +66,7 @@ class InventoryItemFilter(django_filters.FilterSet):
 
 class StockMovementFilter(django_filters.FilterSet):
     search = django_filters.CharFilter(method="filter_search")
-    movement_type = django_filters.CharFilter(field_name="movement_type", lookup_expr="iexact")
+    movement_type = django_filters.CharFilter(method="filter_movement_type")
     item_code = django_filters.CharFilter(field_name="item__code", lookup_expr="icontains")
     date_from = django_filters.DateTimeFilter(field_name="timestamp", lookup_expr="gte")
     date_to = django_filters.DateTimeFilter(field_name="timestamp", lookup_expr="lte")
@@ -40,6 +75,10 @@ class StockMovementFilter(django_filters.FilterSet):
         model = StockMovement
         fields = ["movement_type", "item", "item_code", "date_from", "date_to"]
 
+    def filter_movement_type(self, queryset, name, value):
+        # exact match on the stored upper-case code so the (movement_type, timestamp) index applies
+        return queryset.filter(movement_type=value.upper())
+
     def filter_search(self, queryset, name, value):
         search_val = value
         qs = queryset
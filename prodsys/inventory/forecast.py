@@ -0,0 +1,104 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from statistics import NormalDist
+
+import numpy as np
+from django.db import connection
+from django.utils.timezone import now, localdate, make_aware, get_current_timezone_name
+
+from .models import InventoryItem, StockMovement, ItemForecast
+
+# smallest rate daily_rate can hold, and a cap that keeps days_of_cover inside its Decimal(12, 1) column
+MIN_RATE = 0.00005
+MAX_DAYS_OF_COVER = 99999
+
+
+def daily_usage(item_ids, start, days, chunk_size=50000):
+    """
+    OUT quantities as an (items x days) matrix. The database sums each item's day and returns
+    plain numbers (item id, day offset, total), which are read straight into column arrays.
+    """
+    usage = np.zeros((len(item_ids), days))
+    table = connection.ops.quote_name(StockMovement._meta.db_table)
+    sql = (
+        f"SELECT item_id, (timestamp AT TIME ZONE %s)::date - %s::date AS day, SUM(quantity)::float8 "
+        f"FROM {table} WHERE movement_type = 'OUT' AND timestamp >= %s GROUP BY 1, 2"
+    )
+    since = make_aware(datetime.combine(start, time.min))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [get_current_timezone_name(), start, since])
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            columns = np.array(rows, dtype=float)
+            ids = columns[:, 0].astype(np.int64)
+            item_index = np.minimum(np.searchsorted(item_ids, ids), len(item_ids) - 1)
+            day_index = columns[:, 1].astype(np.int64)
+            # items created after item_ids was read have no row in the matrix
+            keep = (item_ids[item_index] == ids) & (day_index >= 0) & (day_index < days)
+            np.add.at(usage, (item_index[keep], day_index[keep]), columns[keep, 2])
+    return usage
+
+
+def compute_forecasts(window_days=90, rate_days=28, lead_time_days=7, service_level=0.95, today=None):
+    """
+    Consumption rate, variability, days of cover and a suggested reorder level for every item in one pass.
+    rate is the mean daily OUT quantity over the last rate_days; variability is the daily standard
+    deviation over the whole window. The reorder level covers lead-time demand plus safety stock
+    z * std * sqrt(lead time) for the requested service level.
+    Returns the unsaved ItemForecast rows.
+    """
+    today = today or localdate()
+    start = today - timedelta(days=window_days - 1)
+    rate_days = min(rate_days, window_days)
+
+    stock = InventoryItem.objects.order_by("pk").values_list("pk", "quantity")
+    pairs = list(stock.iterator(chunk_size=20000))
+    if not pairs:
+        return []
+    item_ids = np.array([pk for pk, _ in pairs], dtype=np.int64)
+    on_hand = np.array([quantity for _, quantity in pairs], dtype=float)
+
+    usage = daily_usage(item_ids, start, window_days)
+    rate = usage[:, -rate_days:].mean(axis=1)
+    std = usage.std(axis=1, ddof=1) if window_days > 1 else np.zeros(len(item_ids))
+    # a rate that rounds to 0 in daily_rate counts as no consumption, no cover figure
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cover = np.where(rate >= MIN_RATE, np.minimum(on_hand / rate, MAX_DAYS_OF_COVER), np.nan)
+    safety = NormalDist().inv_cdf(service_level) * std * np.sqrt(lead_time_days)
+    reorder = np.maximum(rate * lead_time_days + safety, 0)
+
+    stamp = now()
+    return [
+        ItemForecast(
+            item_id=int(pk),
+            daily_rate=Decimal(f"{r:.4f}"),
+            daily_std=Decimal(f"{s:.4f}"),
+            days_of_cover=None if np.isnan(c) else Decimal(f"{max(c, 0):.1f}"),
+            suggested_reorder_level=Decimal(f"{level:.2f}"),
+            window_days=window_days,
+            lead_time_days=lead_time_days,
+            computed_at=stamp,
+        )
+        for pk, r, s, c, level in zip(item_ids.tolist(), rate.tolist(), std.tolist(), cover.tolist(), reorder.tolist())
+    ]
+
+
+def save_forecasts(forecasts, batch_size=2000):
+    ItemForecast.objects.bulk_create(
+        forecasts,
+        update_conflicts=True,
+        unique_fields=["item"],
+        update_fields=[
+            "daily_rate",
+            "daily_std",
+            "days_of_cover",
+            "suggested_reorder_level",
+            "window_days",
+            "lead_time_days",
+            "computed_at",
+        ],
+        batch_size=batch_size,
+    )
+    return len(forecasts)
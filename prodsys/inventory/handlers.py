@@ -0,0 +1,52 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+
+from core import domain
+from . import dashboard, ledger
+from .events import broker, movement_event
+
+
+def _requested(requests):
+    totals = defaultdict(Decimal)
+    for req in requests:
+        totals[req.stock_item_id] += req.po_quantity
+    return totals
+
+
+@domain.invariant("material_requests.created")
+def reserve_requested_stock(requests, user):
+    ledger.reserve(_requested(requests))
+
+
+@domain.invariant("material_requests.updated")
+def move_reservation(requests, previous, user):
+    ledger.release(_requested(previous))
+    ledger.reserve(_requested(requests))
+
+
+# approval has already taken the stock out as OUT movements, the hold is no longer needed
+@domain.invariant("material_requests.approved")
+@domain.invariant("material_requests.rejected")
+@domain.invariant("material_requests.deleted")
+def release_reservation(requests, user):
+    ledger.release(_requested(requests))
+
+
+@domain.follow_up("stock.moved")
+def update_movement_rollups(movements, categories, after):
+    # the increments are additive, applying them after the commit keeps the totals exact
+    with transaction.atomic():
+        ledger.roll_movement_totals(movements, categories)
+
+
+@domain.follow_up("stock.moved")
+def publish_movements(movements, categories, after):
+    broker.publish([movement_event(move, categories[move.item_id], balance) for move, balance in zip(movements, after)])
+
+
+@domain.follow_up("stock.moved")
+@domain.follow_up("inventory_items.changed")
+def refresh_dashboard(**payload):
+    dashboard.invalidate()
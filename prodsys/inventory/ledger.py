@@ -0,0 +1,434 @@
+from decimal import Decimal
+
+from collections import defaultdict, deque
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Greatest
+from django.utils.timezone import now, localdate
+
+from .models import InventoryItem, StockMovement, CostLayer, DailyStockBalance, StockMovementRollup
+from core import domain
+
+# backends that understand UPDATE ... RETURNING and INSERT ... ON CONFLICT DO UPDATE
+RETURNING_VENDORS = {"postgresql", "sqlite"}
+UNIT_COST_PLACES = Decimal("0.0001")
+
+
+class LedgerError(ValueError):
+    pass
+
+
+class InsufficientStock(LedgerError):
+    pass
+
+
+def balance_delta(movement_type, quantity):
+    # OUT rows store a positive quantity, ADJUST and TRANSFER rows are already signed
+    if movement_type == "OUT":
+        return -quantity
+    return quantity
+
+
+def check_quantity(movement_type, quantity):
+    if quantity is None:
+        raise LedgerError("Quantity is required")
+    if movement_type in ("IN", "OUT") and quantity <= 0:
+        raise LedgerError("Quantity must be positive for " + movement_type)
+    if quantity == 0:
+        raise LedgerError("Quantity cannot be zero")
+
+
+def _shift_balance(item_id, delta, stamp):
+    """
+    Move the stored balance of one item by delta in a single UPDATE.
+    Decreases are guarded so they never take stock that is reserved for open requests.
+    Returns (new balance, category), or None when the guard rejected the update.
+    """
+    if connection.vendor in RETURNING_VENDORS:
+        table = connection.ops.quote_name(InventoryItem._meta.db_table)
+        sql = f"UPDATE {table} SET quantity = quantity + %s, last_updated = %s WHERE id = %s"
+        params = [delta, connection.ops.adapt_datetimefield_value(stamp), item_id]
+        if delta < 0:
+            sql += " AND quantity - reserved >= %s"
+            params.append(-delta)
+        with connection.cursor() as cursor:
+            cursor.execute(sql + " RETURNING quantity, category", params)
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        return InventoryItem._meta.get_field("quantity").to_python(row[0]), row[1]
+
+    qs = InventoryItem.objects.filter(pk=item_id)
+    if delta < 0:
+        qs = qs.filter(quantity__gte=F("reserved") - delta)
+    if not qs.update(quantity=F("quantity") + delta, last_updated=stamp):
+        return None
+    return InventoryItem.objects.filter(pk=item_id).values_list("quantity", "category").get()
+
+
+def _rejected(item_id):
+    item = InventoryItem.objects.filter(pk=item_id).only("code").first()
+    if item is None:
+        return InventoryItem.DoesNotExist(f"Inventory item {item_id} does not exist")
+    return InsufficientStock(f"Insufficient stock for {item.code}")
+
+
+def _latest_costs(item_ids):
+    """Unit cost of each item's newest layer, the price of stock that comes in without one."""
+    # one ordered LIMIT 1 per item on the (item, -id) index, however many drained layers an item has
+    newest = CostLayer.objects.filter(item=OuterRef("pk")).order_by("-id").values("unit_cost")[:1]
+    rows = InventoryItem.objects.filter(pk__in=item_ids).order_by().annotate(cost=Subquery(newest)).values_list("pk", "cost")
+    return {pk: cost for pk, cost in rows if cost is not None}
+
+
+def _cost_movements(movements):
+    """
+    Run movements, in order, through the FIFO cost layers of their items.
+    Incoming stock opens a layer at its unit_cost, or at the item's latest cost when it has none.
+    Outgoing stock drains the oldest open layers and takes their weighted cost as its unit_cost;
+    a part no open layer covers is costed at the latest cost.
+    The callers hold the item locks, so the layers cannot change underneath.
+    Returns (drained, opened): existing layers whose remaining changed and new, unsaved layers.
+    """
+    item_ids = {move.item_id for move in movements}
+    open_layers = defaultdict(deque)
+    for layer in CostLayer.objects.filter(item__in=item_ids, remaining__gt=0).order_by("id"):
+        open_layers[layer.item_id].append(layer)
+    latest = _latest_costs(item_ids)
+    drained = {}
+    opened = []
+
+    for move in movements:
+        delta = balance_delta(move.movement_type, move.quantity)
+        if delta > 0:
+            if move.unit_cost is None:
+                move.unit_cost = latest.get(move.item_id, Decimal("0"))
+            layer = CostLayer(item_id=move.item_id, movement=move, unit_cost=move.unit_cost, quantity=delta, remaining=delta)
+            open_layers[move.item_id].append(layer)
+            opened.append(layer)
+            latest[move.item_id] = move.unit_cost
+            continue
+
+        needed = -delta
+        value = Decimal("0")
+        layers = open_layers[move.item_id]
+        while needed and layers:
+            layer = layers[0]
+            taken = min(needed, layer.remaining)
+            layer.remaining -= taken
+            needed -= taken
+            value += taken * layer.unit_cost
+            if layer.pk:
+                drained[layer.pk] = layer
+            if not layer.remaining:
+                layers.popleft()
+        value += needed * latest.get(move.item_id, Decimal("0"))
+        move.unit_cost = (value / -delta).quantize(UNIT_COST_PLACES)
+
+    return list(drained.values()), opened
+
+
+def _write_movements(movements):
+    drained, opened = _cost_movements(movements)
+    movements = StockMovement.objects.bulk_create(movements, batch_size=1000)
+    CostLayer.objects.bulk_update(drained, ["remaining"], batch_size=1000)
+    # the layers point at the movements, which only have a pk now
+    CostLayer.objects.bulk_create(opened, batch_size=1000)
+    return movements
+
+
+def _running_balances(movements, balances):
+    """
+    The item balance right after each movement.
+    balances holds each item's balance after the last of the movements, so walk them backwards.
+    """
+    running = dict(balances)
+    after = []
+    for move in reversed(movements):
+        after.append(running[move.item_id])
+        running[move.item_id] -= balance_delta(move.movement_type, move.quantity)
+    after.reverse()
+    return after
+
+
+def _roll_daily_balances(movements, after):
+    """Upsert the closing balance of every (item, day) the movements touched."""
+    closing = {}
+    for move, balance in zip(movements, after):
+        closing[(move.item_id, localdate(move.timestamp))] = balance
+
+    DailyStockBalance.objects.bulk_create(
+        [DailyStockBalance(item_id=item_id, date=day, closing_balance=balance) for (item_id, day), balance in closing.items()],
+        update_conflicts=True,
+        unique_fields=["item", "date"],
+        update_fields=["closing_balance"],
+        batch_size=1000,
+    )
+
+
+def roll_movement_totals(movements, categories):
+    totals = defaultdict(lambda: [0, 0])
+    for move in movements:
+        key = (localdate(move.timestamp), move.movement_type, categories[move.item_id])
+        totals[key][0] += move.quantity
+        totals[key][1] += 1
+
+    if connection.vendor in RETURNING_VENDORS:
+        table = connection.ops.quote_name(StockMovementRollup._meta.db_table)
+        with connection.cursor() as cursor:
+            for (day, movement_type, category), (quantity, count) in totals.items():
+                cursor.execute(
+                    f"INSERT INTO {table} (date, movement_type, category, total_quantity, movement_count) "
+                    f"VALUES (%s, %s, %s, %s, %s) "
+                    f"ON CONFLICT (date, movement_type, category) DO UPDATE SET "
+                    f"total_quantity = {table}.total_quantity + excluded.total_quantity, "
+                    f"movement_count = {table}.movement_count + excluded.movement_count",
+                    [connection.ops.adapt_datefield_value(day), movement_type, category, quantity, count],
+                )
+        return
+
+    for (day, movement_type, category), (quantity, count) in totals.items():
+        key = {"date": day, "movement_type": movement_type, "category": category}
+        increment = {"total_quantity": F("total_quantity") + quantity, "movement_count": F("movement_count") + count}
+        if StockMovementRollup.objects.filter(**key).update(**increment):
+            continue
+        try:
+            with transaction.atomic():
+                StockMovementRollup.objects.create(total_quantity=quantity, movement_count=count, **key)
+        except IntegrityError:
+            StockMovementRollup.objects.filter(**key).update(**increment)
+
+
+def _after_write(movements, balances, categories):
+    # closing balances follow the row locks held right now, so they stay in this transaction;
+    # rollups are additive and the rest is best effort, those wait for the commit
+    after = _running_balances(movements, balances)
+    _roll_daily_balances(movements, after)
+    domain.dispatch("stock.moved", movements=movements, categories=categories, after=after)
+
+
+def record_movement(item, movement_type, quantity, reference=None, remarks=None, user=None, unit_cost=None):
+    """
+    Apply one IN / OUT / ADJUST movement and write its ledger row.
+    item may be an InventoryItem or its pk; an instance is refreshed in place.
+    unit_cost prices incoming stock, see _cost_movements.
+    Returns the new balance.
+    """
+    quantity = Decimal(str(quantity))
+    check_quantity(movement_type, quantity)
+    item_id = getattr(item, "pk", item)
+    stamp = now()
+
+    with transaction.atomic():
+        shifted = _shift_balance(item_id, balance_delta(movement_type, quantity), stamp)
+        if shifted is None:
+            raise _rejected(item_id)
+        balance, category = shifted
+        movements = _write_movements([
+            StockMovement(
+                item_id=item_id,
+                movement_type=movement_type,
+                quantity=quantity,
+                unit_cost=unit_cost,
+                reference=reference,
+                remarks=remarks,
+                created_by=user,
+            )
+        ])
+        _after_write(movements, {item_id: balance}, {item_id: category})
+
+    if isinstance(item, InventoryItem):
+        item.quantity = balance
+        # the database keeps available, an instance only learns it on its next load
+        item.available = balance - item.reserved
+        item.last_updated = stamp
+    return balance
+
+
+def transfer_stock(from_item, to_item, quantity, reference=None, user=None):
+    """
+    Move quantity from one item to another as a pair of TRANSFER rows.
+    Rows are updated in pk order so two opposite transfers cannot deadlock.
+    Returns (from_balance, to_balance).
+    """
+    quantity = Decimal(str(quantity))
+    check_quantity("OUT", quantity)
+    if from_item.pk == to_item.pk:
+        raise LedgerError("Cannot transfer to same item")
+    stamp = now()
+
+    legs = [
+        (from_item, -quantity, "To " + str(to_item.code)),
+        (to_item, quantity, "From " + str(from_item.code)),
+    ]
+    balances = {}
+    categories = {}
+    with transaction.atomic():
+        for item, delta, _ in sorted(legs, key=lambda leg: leg[0].pk):
+            shifted = _shift_balance(item.pk, delta, stamp)
+            if shifted is None:
+                raise _rejected(item.pk)
+            balances[item.pk], categories[item.pk] = shifted
+        movements = [
+            StockMovement(
+                item_id=item.pk,
+                movement_type="TRANSFER",
+                quantity=delta,
+                reference=reference,
+                remarks=remarks,
+                created_by=user,
+            )
+            for item, delta, remarks in legs
+        ]
+        # the outgoing leg is costed first, the stock arrives at the cost it left with
+        _write_movements(movements[:1])
+        movements[1].unit_cost = movements[0].unit_cost
+        _write_movements(movements[1:])
+        _after_write(movements, balances, categories)
+
+    for item, _, _ in legs:
+        item.quantity = balances[item.pk]
+        item.available = balances[item.pk] - item.reserved
+        item.last_updated = stamp
+    return balances[from_item.pk], balances[to_item.pk]
+
+
+def correct_balances(targets):
+    """
+    Set the stored quantity of drifted items to targets (item pk -> balance) without writing a movement:
+    the ledger already holds that balance, only the item row and its cost layers are off. The open
+    layers are brought to the target as an ADJUST of their difference would bring them. An item whose
+    target is below its reserved stock is refused, it would leave a pending request short.
+    Returns (corrected item pks, {item pk: reason} for the refused ones).
+    """
+    stamp = now()
+    refused = {}
+    corrections = []
+    with transaction.atomic():
+        items = list(InventoryItem.objects.select_for_update().filter(pk__in=targets).order_by("pk"))
+        layered = dict(
+            CostLayer.objects.filter(item__in=targets, remaining__gt=0).order_by()
+            .values("item_id").annotate(total=Sum("remaining")).values_list("item_id", "total")
+        )
+        changed = []
+        for item in items:
+            target = targets[item.pk]
+            if target < item.reserved:
+                refused[item.pk] = f"Ledger balance {target} of {item.code} is below its {item.reserved} reserved"
+                continue
+            if target != item.quantity:
+                item.quantity, item.last_updated = target, stamp
+                changed.append(item)
+            if target != layered.get(item.pk, 0):
+                corrections.append(StockMovement(item_id=item.pk, movement_type="ADJUST", quantity=target - layered.get(item.pk, 0), timestamp=stamp))
+        if not changed and not corrections:
+            return [], refused
+
+        drained, opened = _cost_movements(corrections)
+        for layer in opened:
+            # the correction is not a ledger row, its layer has no movement
+            layer.movement = None
+        CostLayer.objects.bulk_update(drained, ["remaining"], batch_size=1000)
+        CostLayer.objects.bulk_create(opened, batch_size=1000)
+        InventoryItem.objects.bulk_update(changed, ["quantity", "last_updated"], batch_size=1000)
+        # today's closing balance was rolled from the drifted quantity
+        _roll_daily_balances([StockMovement(item_id=item.pk, timestamp=stamp) for item in changed], [item.quantity for item in changed])
+        corrected = {item.pk for item in changed} | {move.item_id for move in corrections}
+        domain.dispatch("inventory_items.changed", items=sorted(corrected))
+    return sorted(corrected), refused
+
+
+def reserve(totals):
+    """
+    Hold stock for open requests; totals maps item pk to quantity.
+    Each item takes one guarded UPDATE, in pk order, that refuses to reserve more than is available.
+    Raises InsufficientStock and reserves nothing when any item is short.
+    """
+    with transaction.atomic():
+        for item_id, quantity in sorted(totals.items()):
+            held = InventoryItem.objects.filter(pk=item_id, quantity__gte=F("reserved") + quantity).update(reserved=F("reserved") + quantity)
+            if not held:
+                raise _rejected(item_id)
+
+
+def release(totals):
+    """Give back reserved stock; totals maps item pk to quantity. reserved never drops below zero."""
+    with transaction.atomic():
+        for item_id, quantity in sorted(totals.items()):
+            InventoryItem.objects.filter(pk=item_id).update(reserved=Greatest(F("reserved") - quantity, Decimal("0")))
+
+
+def record_batch(lines, user=None, atomic=True):
+    """
+    Apply many movements at once.
+    lines are dicts with item (pk), movement_type, quantity and optional reference / remarks / unit_cost.
+    A decrease may not take reserved stock, unless its line is marked reserved=True: an approved
+    request drawing the stock that was held for it.
+    Every affected item is locked in one ordered SELECT ... FOR UPDATE, lines are checked
+    against a running balance, then the movements are bulk inserted and each item gets
+    its net change in one bulk update.
+    With atomic=True any bad line rejects the whole batch; otherwise bad lines are skipped.
+    Returns (movements, errors) where errors is a list of {"line": index, "error": message}.
+    """
+    stamp = now()
+    item_ids = sorted({line["item"] for line in lines})
+
+    with transaction.atomic():
+        items = {
+            item.pk: item
+            for item in InventoryItem.objects.select_for_update().filter(pk__in=item_ids).order_by("pk")
+        }
+        balances = {pk: item.quantity for pk, item in items.items()}
+        held = {pk: item.reserved for pk, item in items.items()}
+        movements = []
+        errors = []
+
+        for index, line in enumerate(lines):
+            item = items.get(line["item"])
+            if item is None:
+                errors.append({"line": index, "error": f"Inventory item {line['item']} does not exist"})
+                continue
+            movement_type = line["movement_type"]
+            quantity = Decimal(str(line["quantity"]))
+            try:
+                check_quantity(movement_type, quantity)
+            except LedgerError as e:
+                errors.append({"line": index, "error": str(e)})
+                continue
+            delta = balance_delta(movement_type, quantity)
+            # the request's own hold covers a reserved line, the rest of the batch sees it as used up
+            drawn = min(-delta, held[item.pk]) if delta < 0 and line.get("reserved") else 0
+            if delta < 0 and balances[item.pk] - held[item.pk] + drawn + delta < 0:
+                errors.append({"line": index, "error": f"Insufficient stock for {item.code}"})
+                continue
+            balances[item.pk] += delta
+            held[item.pk] -= drawn
+            movements.append(StockMovement(
+                item_id=item.pk,
+                movement_type=movement_type,
+                quantity=quantity,
+                unit_cost=None if line.get("unit_cost") is None else Decimal(str(line["unit_cost"])),
+                reference=line.get("reference"),
+                remarks=line.get("remarks"),
+                created_by=user,
+            ))
+
+        if (errors and atomic) or not movements:
+            return [], errors
+
+        touched = []
+        for pk in sorted({m.item_id for m in movements}):
+            item = items[pk]
+            item.quantity = balances[pk]
+            item.last_updated = stamp
+            touched.append(item)
+        InventoryItem.objects.bulk_update(touched, ["quantity", "last_updated"], batch_size=500)
+        _write_movements(movements)
+        _after_write(
+            movements,
+            {item.pk: item.quantity for item in touched},
+            {item.pk: item.category for item in touched},
+        )
+
+    return movements, errors
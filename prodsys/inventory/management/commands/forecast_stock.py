@@ -0,0 +1,31 @@
+from time import monotonic
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.forecast import compute_forecasts, save_forecasts
+
+
+class Command(BaseCommand):
+    help = "Forecast consumption rate, days of cover and a suggested reorder level for every inventory item"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--window", type=int, default=90, help="Days of OUT history to read")
+        parser.add_argument("--rate-days", type=int, default=28, help="Most recent days averaged into the consumption rate")
+        parser.add_argument("--lead-time", type=int, default=7, help="Replenishment lead time in days")
+        parser.add_argument("--service-level", type=float, default=0.95, help="Chance of not running out during the lead time")
+
+    def handle(self, *args, **options):
+        if options["window"] < 1 or options["rate_days"] < 1 or options["lead_time"] < 0:
+            raise CommandError("--window and --rate-days must be positive, --lead-time cannot be negative")
+        if not 0 < options["service_level"] < 1:
+            raise CommandError("--service-level must be between 0 and 1")
+
+        started = monotonic()
+        forecasts = compute_forecasts(
+            window_days=options["window"],
+            rate_days=options["rate_days"],
+            lead_time_days=options["lead_time"],
+            service_level=options["service_level"],
+        )
+        saved = save_forecasts(forecasts)
+        self.stdout.write(self.style.SUCCESS(f"Forecast {saved} items in {monotonic() - started:.1f}s"))
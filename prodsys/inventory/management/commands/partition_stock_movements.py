@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from inventory import partitioning
+
+
+class Command(BaseCommand):
+    help = "Create the monthly stock movement partitions ahead of time (only when the table is partitioned)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--months", type=int, default=None, help="Months ahead to create, default STOCK_MOVEMENT_PARTITIONS_AHEAD")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            self.stdout.write(self.style.WARNING("Partitioning needs PostgreSQL, nothing to do"))
+            return
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            if not partitioning.is_partitioned(cursor):
+                self.stdout.write(self.style.WARNING(
+                    f"{partitioning.TABLE} is not partitioned. Set STOCK_MOVEMENT_PARTITIONING=True, then run "
+                    "'migrate inventory 0012' and 'migrate' to rebuild it"
+                ))
+                return
+            created = partitioning.maintain(cursor, options["months"])
+            total = len(partitioning.partitions(cursor))
+
+        for name in created:
+            self.stdout.write(f"Created {name}")
+        self.stdout.write(self.style.SUCCESS(f"{len(created)} partitions created, {total} monthly partitions in place"))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from inventory.bom import rebuild_requirements
+from inventory.models import BillOfMaterial
+
+
+class Command(BaseCommand):
+    help = "Rebuild the flattened BOM requirements of every item from its BillOfMaterial lines"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            item_ids = set(BillOfMaterial.objects.values_list("finished_item_id", flat=True))
+            count = rebuild_requirements(item_ids)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt requirements for {count} items"))
@@ -0,0 +1,89 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum, Count
+from django.db.models.functions import TruncDate
+from django.utils.timezone import localdate
+
+from inventory.models import InventoryItem, StockMovement, DailyStockBalance, StockMovementRollup, movement_delta
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the stock rollup tables from the StockMovement ledger. "
+        "Run it while no stock is moving; the ledger keeps the tables current afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = self.rebuild_daily_balances(options["batch_size"])
+            totals = self.rebuild_movement_rollups(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} daily balances and {totals} movement rollups"))
+
+    def opening_balances(self):
+        """
+        Stock each item held before its first movement: the live quantity the ledger keeps, less
+        every movement. Non-zero only for stock set before quantity could only move through the ledger.
+        """
+        moved = dict(StockMovement.objects.order_by().values("item_id").annotate(total=Sum(movement_delta())).values_list("item_id", "total"))
+        return {
+            item_id: (quantity - moved.get(item_id, 0), updated)
+            for item_id, quantity, updated in InventoryItem.objects.order_by().values_list("id", "quantity", "last_updated").iterator()
+            if quantity != moved.get(item_id, 0)
+        }
+
+    def rebuild_daily_balances(self, batch_size):
+        DailyStockBalance.objects.all().delete()
+        openings = self.opening_balances()
+        per_day = (
+            StockMovement.objects.order_by()
+            .annotate(date=TruncDate("timestamp"))
+            .values("item_id", "date")
+            .annotate(delta=Sum(movement_delta()))
+            .order_by("item_id", "date")
+            .values_list("item_id", "date", "delta")
+        )
+        count = 0
+        batch = []
+        current_item = None
+        balance = 0
+        # running total per item, streamed in (item, day) order, starting from the opening stock
+        for item_id, date, delta in per_day.iterator(chunk_size=batch_size):
+            if item_id != current_item:
+                current_item = item_id
+                balance, _ = openings.pop(item_id, (0, None))
+                if balance:
+                    batch.append(DailyStockBalance(item_id=item_id, date=date - timedelta(days=1), closing_balance=balance))
+            balance += delta
+            batch.append(DailyStockBalance(item_id=item_id, date=date, closing_balance=balance))
+            if len(batch) >= batch_size:
+                DailyStockBalance.objects.bulk_create(batch)
+                count += len(batch)
+                batch = []
+        # items that never moved hold their opening stock from their last edit on
+        batch += [
+            DailyStockBalance(item_id=item_id, date=localdate(updated), closing_balance=balance)
+            for item_id, (balance, updated) in openings.items()
+        ]
+        DailyStockBalance.objects.bulk_create(batch, batch_size=batch_size)
+        return count + len(batch)
+
+    def rebuild_movement_rollups(self, batch_size):
+        StockMovementRollup.objects.all().delete()
+        rows = (
+            StockMovement.objects.order_by()
+            .annotate(date=TruncDate("timestamp"))
+            .values("date", "movement_type", "item__category")
+            .annotate(total=Sum("quantity"), count=Count("id"))
+            .values_list("date", "movement_type", "item__category", "total", "count")
+        )
+        rollups = [
+            StockMovementRollup(date=date, movement_type=movement_type, category=category, total_quantity=total, movement_count=count)
+            for date, movement_type, category, total, count in rows
+        ]
+        StockMovementRollup.objects.bulk_create(rollups, batch_size=batch_size)
+        return len(rollups)
@@ -0,0 +1,60 @@
+from django.db import transaction
+from django.db.models import Sum
+
+from inventory.ledger import correct_balances
+from inventory.management.reports import ReportCommand
+from inventory.models import InventoryItem, StockMovement, movement_delta
+
+
+class Command(ReportCommand):
+    help = "Compare every InventoryItem.quantity with its StockMovement ledger balance and report or fix the drift"
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument("--full", action="store_true", help="Aggregate the whole ledger instead of starting from checkpoints")
+        parser.add_argument("--fix", action="store_true", help="Set drifted quantities to their ledger balance, except below reserved stock")
+
+    def ledger_balances(self, full, item_ids=None):
+        if full:
+            moves = StockMovement.objects.order_by()
+            if item_ids is not None:
+                moves = moves.filter(item_id__in=item_ids)
+            rows = moves.values("item_id").annotate(balance=Sum(movement_delta())).values_list("item_id", "balance")
+            return dict(rows.iterator(chunk_size=5000))
+
+        items = InventoryItem.objects.order_by()
+        if item_ids is not None:
+            items = items.filter(pk__in=item_ids)
+        return dict(items.with_ledger_balance().values_list("pk", "ledger_balance").iterator(chunk_size=5000))
+
+    def handle(self, *args, **options):
+        balances = self.ledger_balances(options["full"])
+        drift = []
+        stored = InventoryItem.objects.order_by("pk").values_list("pk", "code", "quantity")
+        for pk, code, quantity in stored.iterator(chunk_size=5000):
+            ledger = balances.get(pk) or 0
+            if quantity != ledger:
+                drift.append({
+                    "id": pk,
+                    "code": code,
+                    "quantity": str(quantity),
+                    "ledger": str(ledger),
+                    "difference": str(quantity - ledger),
+                })
+
+        self.write_report(drift, ["id", "code", "quantity", "ledger", "difference"], options)
+        self.stderr.write(f"{len(drift)} items drifted from the ledger")
+
+        if options["fix"] and drift:
+            fixed, refused = self.fix(drift, options["full"])
+            for reason in refused.values():
+                self.stderr.write(self.style.WARNING(reason))
+            self.stderr.write(self.style.SUCCESS(f"Fixed {len(fixed)} items, left {len(refused)} with their ledger below reserved"))
+
+    def fix(self, drift, full):
+        item_ids = [row["id"] for row in drift]
+        with transaction.atomic():
+            # lock and re-read so movements written since the scan are not overwritten
+            list(InventoryItem.objects.select_for_update().filter(pk__in=item_ids).order_by("pk").values_list("pk"))
+            balances = self.ledger_balances(full, item_ids)
+            return correct_balances({pk: balances.get(pk) or 0 for pk in item_ids})
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from inventory.models import InventoryItem, StockCheckpoint
+
+
+class Command(BaseCommand):
+    help = "Roll stock balance checkpoints forward so recalculation only reads recent movements"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Items locked and checkpointed per transaction")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        item_ids = list(InventoryItem.objects.order_by("pk").values_list("pk", flat=True))
+        created = 0
+        drifted = 0
+
+        for start in range(0, len(item_ids), batch_size):
+            chunk = item_ids[start:start + batch_size]
+            with transaction.atomic():
+                # holding the item rows means no movement for them is still uncommitted,
+                # so the newest movement id is a safe high-water mark
+                list(InventoryItem.objects.select_for_update().filter(pk__in=chunk).order_by("pk").values_list("pk"))
+                rows = (
+                    InventoryItem.objects.with_ledger_balance()
+                    .filter(pk__in=chunk, ledger_mark__gt=F("checkpoint_mark"))
+                    .values_list("pk", "quantity", "ledger_balance", "ledger_mark")
+                )
+                checkpoints = []
+                for pk, quantity, balance, mark in rows:
+                    if quantity != balance:
+                        drifted += 1
+                    checkpoints.append(StockCheckpoint(item_id=pk, balance=balance, last_movement_id=mark))
+                StockCheckpoint.objects.bulk_create(checkpoints, batch_size=1000)
+                created += len(checkpoints)
+
+        self.stdout.write(self.style.SUCCESS(f"Created {created} checkpoints for {len(item_ids)} items"))
+        if drifted:
+            self.stdout.write(self.style.WARNING(f"{drifted} items have a stored quantity that differs from the ledger"))
@@ -0,0 +1,38 @@
+import csv
+
+from django.core.management.base import CommandError
+
+from inventory.management.reports import ReportCommand
+from inventory.mrp import run_mrp
+from inventory.serializers import MrpPlanSerializer
+
+
+class Command(ReportCommand):
+    help = "Explode a production plan (CSV with code,quantity columns) through the BOMs and report component shortfalls"
+
+    def add_arguments(self, parser):
+        parser.add_argument("plan", help="CSV file with code and quantity columns, one row per job")
+        super().add_arguments(parser)
+        parser.add_argument("--shortfall-only", action="store_true", help="Only list components that are short")
+
+    def handle(self, *args, **options):
+        with open(options["plan"], newline="", encoding="utf-8-sig") as f:
+            jobs = [{key: value for key, value in row.items() if value} for row in csv.DictReader(f)]
+        serializer = MrpPlanSerializer(data={"jobs": jobs})
+        if not serializer.is_valid():
+            raise CommandError(serializer.errors)
+        plan, errors = serializer.plan()
+        if errors:
+            raise CommandError("; ".join(f"row {e['job'] + 2}: {e['error']}" for e in errors[:20]))
+
+        result = run_mrp(plan)
+        rows = result["requirements"]
+        if options["shortfall_only"]:
+            rows = [row for row in rows if float(row["shortfall"]) > 0]
+
+        fields = ["item", "code", "name", "uom", "gross", "on_hand", "requested", "available", "build", "shortfall"]
+        self.write_report(rows, fields, options, document={**result, "requirements": rows})
+
+        if result["without_bom"]:
+            self.stderr.write(self.style.WARNING(f"{len(result['without_bom'])} planned items have no bill of material"))
+        self.stderr.write(f"{len(plan)} jobs, plan is {'feasible' if result['feasible'] else 'short of material'}")
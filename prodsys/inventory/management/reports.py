@@ -0,0 +1,29 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand
+
+
+class ReportCommand(BaseCommand):
+    """
+    A command that writes a CSV or JSON report to stdout or --output.
+    Status lines go to stderr so the report on stdout stays machine readable.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=["csv", "json"], default="csv")
+        parser.add_argument("--output", help="Write the report to this file instead of stdout")
+
+    def write_report(self, rows, fields, options, document=None):
+        """rows go out as CSV with fields as the header; JSON gets document when given, else rows."""
+        out = open(options["output"], "w", newline="") if options["output"] else self.stdout
+        try:
+            if options["format"] == "json":
+                out.write(json.dumps(rows if document is None else document, indent=2) + "\n")
+            else:
+                writer = csv.DictWriter(out, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(rows)
+        finally:
+            if options["output"]:
+                out.close()
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_materialrequest'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('last_movement_id', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-last_movement_id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['item', 'id'], name='inventory_s_item_id_f91d30_idx'),
+        ),
+        migrations.AddField(
+            model_name='stockcheckpoint',
+            name='item',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='inventory.inventoryitem'),
+        ),
+        migrations.AddIndex(
+            model_name='stockcheckpoint',
+            index=models.Index(fields=['item', '-last_movement_id'], name='inventory_s_item_id_4c399e_idx'),
+        ),
+    ]
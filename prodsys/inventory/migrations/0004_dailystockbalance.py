@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_stockcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStockBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('closing_balance', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_balances', to='inventory.inventoryitem')),
+            ],
+            options={
+                'ordering': ['-date'],
+                'unique_together': {('item', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_dailystockbalance'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovementRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('movement_type', models.CharField(choices=[('IN', 'Stock In'), ('OUT', 'Stock Out'), ('ADJUST', 'Adjustment'), ('TRANSFER', 'Transfer')], max_length=10)),
+                ('category', models.CharField(choices=[('RAW', 'Raw Material'), ('CONSUMABLE', 'Consumable'), ('WIP', 'Work In Progress'), ('FG', 'Finished Goods')], max_length=20)),
+                ('total_quantity', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('movement_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-date'],
+                'unique_together': {('date', 'movement_type', 'category')},
+            },
+        ),
+    ]
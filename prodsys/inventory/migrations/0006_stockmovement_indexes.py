@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_stockmovementrollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['timestamp', 'id'], name='inventory_s_timesta_7c54a1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['item', 'timestamp', 'id'], name='inventory_s_item_id_436f8b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['movement_type', 'timestamp', 'id'], name='inventory_s_movemen_ea02e0_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_stockmovement_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventoryitem',
+            name='is_low_stock',
+            field=models.GeneratedField(db_persist=True, expression=models.Q(('quantity__lte', models.F('reorder_level'))), output_field=models.BooleanField()),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryitem',
+            index=models.Index(fields=['last_updated', 'id'], name='inventory_i_last_up_4db5c1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryitem',
+            index=models.Index(condition=models.Q(('is_low_stock', True)), fields=['code'], name='inventory_item_low_stock_idx'),
+        ),
+    ]
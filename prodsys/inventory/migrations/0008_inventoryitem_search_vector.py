@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:33
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_inventoryitem_is_low_stock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventoryitem',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.SearchVector('code', 'name', 'description', config='simple'), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryitem',
+            index=models.Index(fields=['code'], name='inventory_item_code_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryitem',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='inventory_item_search_idx'),
+        ),
+    ]
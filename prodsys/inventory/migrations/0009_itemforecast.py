@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_inventoryitem_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemForecast',
+            fields=[
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='forecast', serialize=False, to='inventory.inventoryitem')),
+                ('daily_rate', models.DecimalField(decimal_places=4, default=0, max_digits=14)),
+                ('daily_std', models.DecimalField(decimal_places=4, default=0, max_digits=14)),
+                ('days_of_cover', models.DecimalField(blank=True, decimal_places=1, max_digits=12, null=True)),
+                ('suggested_reorder_level', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('window_days', models.PositiveIntegerField()),
+                ('lead_time_days', models.PositiveIntegerField()),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['days_of_cover'], name='inventory_i_days_of_daf1dd_idx')],
+            },
+        ),
+    ]
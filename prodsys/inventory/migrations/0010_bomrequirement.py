@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:02
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def flatten_boms(apps, schema_editor):
+    # the historical models have no inventory.bom helpers, flatten every BOM from its lines here
+    BillOfMaterial = apps.get_model("inventory", "BillOfMaterial")
+    BomRequirement = apps.get_model("inventory", "BomRequirement")
+    lines = defaultdict(list)
+    for finished_id, raw_id, quantity in BillOfMaterial.objects.values_list("finished_item", "raw_item", "quantity_required"):
+        lines[finished_id].append((raw_id, quantity))
+
+    flat = {}
+
+    def flatten(item_id, path=()):
+        if item_id not in flat:
+            if item_id in path:
+                raise ValueError(f"Bill of material of item {item_id} is circular")
+            totals = defaultdict(int)
+            for raw_id, quantity in lines[item_id]:
+                if lines.get(raw_id):
+                    for leaf_id, per_unit in flatten(raw_id, path + (item_id,)).items():
+                        totals[leaf_id] += quantity * per_unit
+                else:
+                    totals[raw_id] += quantity
+            flat[item_id] = totals
+        return flat[item_id]
+
+    BomRequirement.objects.bulk_create(
+        [
+            BomRequirement(finished_item_id=item_id, raw_item_id=leaf_id, quantity_per_unit=quantity)
+            for item_id in list(lines)
+            for leaf_id, quantity in flatten(item_id).items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_itemforecast'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BomRequirement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity_per_unit', models.DecimalField(decimal_places=8, max_digits=24)),
+                ('finished_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='flat_requirements', to='inventory.inventoryitem')),
+                ('raw_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.inventoryitem')),
+            ],
+            options={
+                'unique_together': {('finished_item', 'raw_item')},
+            },
+        ),
+        migrations.RunPython(flatten_boms, migrations.RunPython.noop),
+    ]
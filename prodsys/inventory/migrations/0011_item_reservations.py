@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:11
+
+import django.db.models.expressions
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+
+
+def reserve_pending_requests(apps, schema_editor):
+    InventoryItem = apps.get_model("inventory", "InventoryItem")
+    MaterialRequest = apps.get_model("inventory", "MaterialRequest")
+    pending = (
+        MaterialRequest.objects.filter(status="PENDING", stock_item=OuterRef("pk"))
+        .values("stock_item").annotate(total=Sum("po_quantity")).values("total")
+    )
+    InventoryItem.objects.filter(materialrequest__status="PENDING").distinct().update(reserved=Subquery(pending))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0010_bomrequirement'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventoryitem',
+            name='reserved',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='inventoryitem',
+            name='available',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(models.F('quantity'), '-', models.F('reserved')), output_field=models.DecimalField(decimal_places=2, max_digits=13)),
+        ),
+        migrations.RunPython(reserve_pending_requests, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def open_layers_for_stock_on_hand(apps, schema_editor):
+    # stock received before costs were tracked has no known cost, it opens at zero
+    InventoryItem = apps.get_model("inventory", "InventoryItem")
+    CostLayer = apps.get_model("inventory", "CostLayer")
+    items = InventoryItem.objects.filter(quantity__gt=0).values_list("pk", "quantity").iterator(chunk_size=2000)
+    CostLayer.objects.bulk_create(
+        (CostLayer(item_id=pk, unit_cost=0, quantity=quantity, remaining=quantity) for pk, quantity in items),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0011_item_reservations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockmovement',
+            name='unit_cost',
+            field=models.DecimalField(blank=True, decimal_places=4, max_digits=14, null=True),
+        ),
+        migrations.CreateModel(
+            name='CostLayer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unit_cost', models.DecimalField(decimal_places=4, max_digits=14)),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('remaining', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cost_layers', to='inventory.inventoryitem')),
+                ('movement', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cost_layer', to='inventory.stockmovement')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('remaining__gt', 0)), fields=['item', 'id'], name='inventory_cost_layer_open_idx')],
+            },
+        ),
+        migrations.RunPython(open_layers_for_stock_on_hand, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from inventory import partitioning
+
+
+def partition_movements(apps, schema_editor):
+    # opt-in, the table stays as it is unless STOCK_MOVEMENT_PARTITIONING is set when this runs
+    if schema_editor.connection.vendor != "postgresql" or not partitioning.enabled():
+        return
+    with schema_editor.connection.cursor() as cursor:
+        partitioning.partition_table(cursor)
+
+
+def unpartition_movements(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        partitioning.unpartition_table(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_cost_layers'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='costlayer',
+            name='movement',
+            field=models.OneToOneField(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cost_layer', to='inventory.stockmovement'),
+        ),
+        migrations.RunPython(partition_movements, unpartition_movements),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0013_stock_movement_partitions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='costlayer',
+            index=models.Index(fields=['item', '-id'], name='inventory_cost_latest_idx'),
+        ),
+    ]
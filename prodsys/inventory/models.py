@@ -1,6 +1,13 @@
+from datetime import datetime, time
+from decimal import Decimal
+
 from django.db import models, transaction
-from django.db.models import Sum
+from django.db.models import Sum, Max, F, Q, Case, When, Value, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.timezone import localdate, make_aware, now
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.core.exceptions import ValidationError
 
 User = get_user_model()
@@ -19,6 +26,71 @@ class UnitOfMeasure(models.TextChoices):
     LITER = "l", "Liter"
     CARTON = "carton", "Carton"
 
+def movement_delta():
+    # signed effect of a movement on the balance; OUT rows are stored positive,
+    # ADJUST and TRANSFER rows already carry their sign
+    return Case(
+        When(movement_type="OUT", then=-F("quantity")),
+        default=F("quantity"),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+class InventoryItemQuerySet(models.QuerySet):
+    def with_ledger_balance(self):
+        """
+        Annotate ledger_balance: the latest checkpoint balance plus the movements written after it,
+        and ledger_mark: the id of the newest movement included.
+        """
+        latest = StockCheckpoint.objects.filter(item=OuterRef("pk")).order_by("-last_movement_id")
+        tail = StockMovement.objects.filter(item=OuterRef("pk"), id__gt=OuterRef("checkpoint_mark")).order_by().values("item")
+        decimal = models.DecimalField(max_digits=12, decimal_places=2)
+        return self.annotate(
+            checkpoint_balance=Coalesce(Subquery(latest.values("balance")[:1]), Value(Decimal("0")), output_field=decimal),
+            checkpoint_mark=Coalesce(Subquery(latest.values("last_movement_id")[:1]), Value(0)),
+        ).annotate(
+            ledger_tail=Coalesce(
+                Subquery(tail.annotate(total=Sum(movement_delta())).values("total")), Value(Decimal("0")), output_field=decimal
+            ),
+            ledger_mark=Coalesce(Subquery(tail.annotate(last=Max("id")).values("last")), F("checkpoint_mark")),
+        ).annotate(
+            ledger_balance=F("checkpoint_balance") + F("ledger_tail"),
+        )
+
+    def with_balance_as_of(self, moment):
+        """
+        Annotate balance_as_of from the daily closing balances.
+        A date gives the closing balance of that day; a datetime gives the closing balance
+        of the day before plus that day's movements up to the moment.
+        """
+        decimal = models.DecimalField(max_digits=12, decimal_places=2)
+        closing = DailyStockBalance.objects.filter(item=OuterRef("pk")).order_by("-date").values("closing_balance")
+        if not isinstance(moment, datetime):
+            return self.annotate(
+                balance_as_of=Coalesce(Subquery(closing.filter(date__lte=moment)[:1]), Value(Decimal("0")), output_field=decimal)
+            )
+
+        day = localdate(moment)
+        day_moves = (
+            StockMovement.objects.filter(item=OuterRef("pk"), timestamp__gte=make_aware(datetime.combine(day, time.min)), timestamp__lte=moment)
+            .order_by().values("item").annotate(total=Sum(movement_delta())).values("total")
+        )
+        return self.annotate(
+            balance_as_of=Coalesce(Subquery(closing.filter(date__lt=day)[:1]), Value(Decimal("0")), output_field=decimal)
+            + Coalesce(Subquery(day_moves), Value(Decimal("0")), output_field=decimal)
+        )
+
+    def delete(self):
+        # the cascade drops BOM lines without BillOfMaterial.delete(), rebuild what was built from these items
+        from .bom import rebuild_requirements, used_in
+        with transaction.atomic():
+            item_ids = set(self.values_list("pk", flat=True))
+            parents = used_in(item_ids) - item_ids
+            result = super().delete()
+            rebuild_requirements(parents)
+        return result
+
+
 class InventoryItem(models.Model):
     code = models.CharField(max_length=50, unique=True)
     name = models.CharField(max_length=100, default="unamed item")
@@ -32,13 +104,39 @@ class InventoryItem(models.Model):
     uom = models.CharField(max_length=20, choices=UnitOfMeasure.choices, default=UnitOfMeasure.KG)
     reorder_level = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     quantity = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # held by PENDING material requests, moved only by ledger.reserve / ledger.release
+    reserved = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # available to promise, kept by the database so readers never aggregate open requests
+    available = models.GeneratedField(
+        expression=F("quantity") - F("reserved"),
+        output_field=models.DecimalField(max_digits=13, decimal_places=2),
+        db_persist=True,
+    )
+    # kept by the database on every write, whichever code path changed quantity or reorder_level
+    is_low_stock = models.GeneratedField(
+        expression=Q(quantity__lte=F("reorder_level")),
+        output_field=models.BooleanField(),
+        db_persist=True,
+    )
     last_updated = models.DateTimeField(auto_now=True)
+    # full-text tokens of code, name and description, rebuilt by the database on every save
+    search_vector = models.GeneratedField(
+        expression=SearchVector("code", "name", "description", config="simple"),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    objects = InventoryItemQuerySet.as_manager()
 
     class Meta:
         ordering = ["name"]
         indexes = [
             models.Index(fields=["code"]),
             models.Index(fields=["category"]),
+            models.Index(fields=["last_updated", "id"]),
+            models.Index(fields=["code"], condition=Q(is_low_stock=True), name="inventory_item_low_stock_idx"),
+            models.Index(fields=["code"], opclasses=["varchar_pattern_ops"], name="inventory_item_code_prefix_idx"),
+            GinIndex(fields=["search_vector"], name="inventory_item_search_idx"),
         ]
 
     def __str__(self):
@@ -54,11 +152,12 @@ class InventoryItem(models.Model):
     def is_below_reorder(self):
         return self.quantity <= self.reorder_level
 
+    def delete(self, *args, **kwargs):
+        return InventoryItem.objects.filter(pk=self.pk).delete()
+
     def recalc_quantity(self):
-        in_total = self.movements.filter(movement_type="IN").aggregate(total=Sum("quantity"))["total"] or 0
-        out_total = self.movements.filter(movement_type="OUT").aggregate(total=Sum("quantity"))["total"] or 0
-        adjust_total = self.movements.filter(movement_type="ADJUST").aggregate(total=Sum("quantity"))["total"] or 0
-        calculated = in_total - out_total + adjust_total
+        # only the movements after the latest checkpoint are aggregated
+        calculated = InventoryItem.objects.with_ledger_balance().filter(pk=self.pk).values_list("ledger_balance", flat=True).get()
         self.quantity = calculated
         self.save(update_fields=["quantity", "last_updated"])
         return self.quantity
@@ -74,6 +173,8 @@ class StockMovement(models.Model):
     item = models.ForeignKey(InventoryItem, on_delete=models.CASCADE, related_name="movements")
     movement_type = models.CharField(max_length=10, choices=MOVEMENT_TYPES)
     quantity = models.DecimalField(max_digits=12, decimal_places=2)
+    # incoming: the purchase cost of the layer it opened; outgoing: the FIFO cost of the layers it drained
+    unit_cost = models.DecimalField(max_digits=14, decimal_places=4, blank=True, null=True)
     reference = models.CharField(max_length=100, blank=True, null=True)
     remarks = models.TextField(blank=True, null=True)
     timestamp = models.DateTimeField(auto_now_add=True)
@@ -81,10 +182,108 @@ class StockMovement(models.Model):
 
     class Meta:
         ordering = ["-timestamp"]
+        indexes = [
+            models.Index(fields=["item", "id"]),
+            models.Index(fields=["timestamp", "id"]),
+            models.Index(fields=["item", "timestamp", "id"]),
+            models.Index(fields=["movement_type", "timestamp", "id"]),
+        ]
 
     def __str__(self):
         return f"{self.movement_type} - {self.item.code} ({self.quantity})"
 
+
+class CostLayer(models.Model):
+    """
+    Stock received at one unit cost. Outgoing movements drain the oldest open layers first,
+    so valuation is a sum over the open layers instead of a replay of the ledger.
+    """
+    item = models.ForeignKey(InventoryItem, on_delete=models.CASCADE, related_name="cost_layers")
+    # null for the opening layers that hold stock from before costs were tracked;
+    # no database constraint, a foreign key cannot point into a partitioned movement table
+    movement = models.OneToOneField(
+        StockMovement, on_delete=models.SET_NULL, null=True, blank=True, related_name="cost_layer", db_constraint=False
+    )
+    unit_cost = models.DecimalField(max_digits=14, decimal_places=4)
+    quantity = models.DecimalField(max_digits=12, decimal_places=2)
+    remaining = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["item", "id"], condition=Q(remaining__gt=0), name="inventory_cost_layer_open_idx"),
+            # newest layer of an item, the price of stock that arrives without a unit cost
+            models.Index(fields=["item", "-id"], name="inventory_cost_latest_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.item.code}: {self.remaining}/{self.quantity} @ {self.unit_cost}"
+
+
+class StockCheckpoint(models.Model):
+    # verified balance of an item up to and including movement last_movement_id
+    item = models.ForeignKey(InventoryItem, on_delete=models.CASCADE, related_name="checkpoints")
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+    last_movement_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-last_movement_id"]
+        indexes = [
+            models.Index(fields=["item", "-last_movement_id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.item.code} = {self.balance} @ {self.last_movement_id}"
+
+
+class DailyStockBalance(models.Model):
+    # closing balance of an item on each day it moved, written by the ledger
+    item = models.ForeignKey(InventoryItem, on_delete=models.CASCADE, related_name="daily_balances")
+    date = models.DateField()
+    closing_balance = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        ordering = ["-date"]
+        unique_together = ("item", "date")
+
+    def __str__(self):
+        return f"{self.item.code} {self.date}: {self.closing_balance}"
+
+
+class StockMovementRollup(models.Model):
+    # per-day movement totals for the dashboards, incremented by the ledger
+    date = models.DateField()
+    movement_type = models.CharField(max_length=10, choices=StockMovement.MOVEMENT_TYPES)
+    category = models.CharField(max_length=20, choices=InventoryCategory.choices)
+    total_quantity = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    movement_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["-date"]
+        unique_together = ("date", "movement_type", "category")
+
+    def __str__(self):
+        return f"{self.date} {self.movement_type} {self.category}: {self.total_quantity} ({self.movement_count})"
+
+
+class ItemForecast(models.Model):
+    # consumption forecast per item, rewritten by the forecast_stock command
+    item = models.OneToOneField(InventoryItem, on_delete=models.CASCADE, primary_key=True, related_name="forecast")
+    daily_rate = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+    daily_std = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+    days_of_cover = models.DecimalField(max_digits=12, decimal_places=1, null=True, blank=True)
+    suggested_reorder_level = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    window_days = models.PositiveIntegerField()
+    lead_time_days = models.PositiveIntegerField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [models.Index(fields=["days_of_cover"])]
+
+    def __str__(self):
+        return f"{self.item.code}: {self.daily_rate}/day, {self.days_of_cover} days of cover"
+
 class MaterialRequest(models.Model):
     STATUS_CHOICES = [
         ("PENDING", "Pending"),
@@ -107,33 +306,30 @@ class MaterialRequest(models.Model):
                 })
 
     def save(self, *args, **kwargs):
+        # approval is not a save side effect, it is dispatched as material_requests.approved
         self.full_clean()
-        new_approval = False
-        if self.pk:
-            original = MaterialRequest.objects.get(pk=self.pk)
-            if original.status != "APPROVED" and self.status == "APPROVED":
-                new_approval = True
-        else:
-            if self.status == "APPROVED":
-                new_approval = True
-
         super().save(*args, **kwargs)
 
-        if new_approval:
-            deduct_stock(
-                {self.stock_item.id: self.po_quantity},
-                reference=f"MaterialRequest-{self.id}",
-                user=self.requested_by
-            )
-
     def __str__(self):
         return f"{self.stock_item.code} ({self.po_quantity}) - {self.status}"
 
+class BillOfMaterialQuerySet(models.QuerySet):
+    def delete(self):
+        from .bom import rebuild_requirements
+        with transaction.atomic():
+            finished_ids = set(self.values_list("finished_item_id", flat=True))
+            result = super().delete()
+            rebuild_requirements(finished_ids)
+        return result
+
+
 class BillOfMaterial(models.Model):
     finished_item = models.ForeignKey(InventoryItem, on_delete=models.CASCADE, related_name="bom_lines")
     raw_item = models.ForeignKey(InventoryItem, on_delete=models.CASCADE, related_name="used_in_boms")
     quantity_required = models.DecimalField(max_digits=12, decimal_places=2)
 
+    objects = BillOfMaterialQuerySet.as_manager()
+
     class Meta:
         unique_together = ("finished_item", "raw_item")
 
@@ -143,27 +339,128 @@ class BillOfMaterial(models.Model):
     def clean(self):
         if self.quantity_required <= 0:
             raise ValidationError({"quantity_required": "Quantity required must be positive"})
+        if self.finished_item_id and self.raw_item_id:
+            from .bom import check_cycle
+            check_cycle(self.finished_item_id, self.raw_item_id)
+
+    def save(self, *args, **kwargs):
+        from .bom import rebuild_requirements
+        self.full_clean()
+        with transaction.atomic():
+            previous = BillOfMaterial.objects.filter(pk=self.pk).values_list("finished_item_id", flat=True).first() if self.pk else None
+            super().save(*args, **kwargs)
+            rebuild_requirements({self.finished_item_id, previous} - {None})
+
+    def delete(self, *args, **kwargs):
+        from .bom import rebuild_requirements
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            rebuild_requirements([self.finished_item_id])
+        return result
+
+
+class BomRequirement(models.Model):
+    # flattened raw requirement per unit of a built item across every BOM level, kept by BillOfMaterial.save / delete
+    # and by the queryset deletes of BOM lines and items; bulk_create / update of BOM lines bypass it, run
+    # rebuild_bom_requirements after those
+    finished_item = models.ForeignKey(InventoryItem, on_delete=models.CASCADE, related_name="flat_requirements")
+    raw_item = models.ForeignKey(InventoryItem, on_delete=models.CASCADE, related_name="+")
+    quantity_per_unit = models.DecimalField(max_digits=24, decimal_places=8)
+
+    class Meta:
+        unique_together = ("finished_item", "raw_item")
+
+    def __str__(self):
+        return f"{self.finished_item.code} needs {self.quantity_per_unit} of {self.raw_item.code} per unit"
 
 def deduct_stock(materials: dict[int, float], reference: str = None, user: User = None):
-    from .models import InventoryItem, StockMovement
+    """
+    Take every material out of stock as one batch: the items are locked together in pk order,
+    checked together, then updated with one bulk UPDATE and logged with one bulk INSERT.
+    Raises LedgerError, naming every short or missing item, before anything is written.
+    """
+    from .ledger import record_batch, LedgerError
+    for item_id, qty in materials.items():
+        if qty <= 0:
+            raise ValueError(f"Quantity must be positive for item {item_id}")
+
+    lines = [
+        {"item": item_id, "movement_type": "OUT", "quantity": qty, "reference": reference, "remarks": "Auto-deducted via transaction"}
+        for item_id, qty in sorted(materials.items())
+    ]
+    movements, errors = record_batch(lines, user=user, atomic=True)
+    if errors:
+        raise LedgerError("; ".join(error["error"] for error in errors))
+    return movements
+
+
+def _lock_pending(requests):
+    """Lock the rows of the PENDING requests among requests in pk order and return them as they are now."""
+    return list(
+        MaterialRequest.objects.select_for_update()
+        .filter(pk__in=[req.pk for req in requests], status="PENDING").order_by("pk")
+    )
+
+
+def approve_requests(requests, user: User = None, atomic: bool = True):
+    """
+    Approve PENDING material requests as one batch and take their stock out.
+    The request rows are locked in pk order, then record_batch locks their items once and checks
+    every request against a running balance, so several requests for one item cannot overdraw it.
+    With atomic=True any failure approves nothing and raises LedgerError; otherwise the failed
+    requests stay PENDING. Returns (approved, errors) where errors maps request pk to a message.
+    """
+    from .ledger import record_batch, LedgerError
+    from core import domain
+
     with transaction.atomic():
-        for item_id, qty in materials.items():
-            if qty <= 0:
-                raise ValueError(f"Quantity must be positive for item {item_id}")
-
-            item = InventoryItem.objects.select_for_update().get(pk=item_id)
-            if item.quantity < qty:
-                raise ValueError(f"Insufficient stock for {item.code}")
-
-            new_qty = item.quantity - qty
-            item.quantity = new_qty
-            item.save(update_fields=["quantity", "last_updated"])
-
-            StockMovement.objects.create(
-                item=item,
-                movement_type="OUT",
-                quantity=qty,
-                reference=reference,
-                remarks="Auto-deducted via transaction",
-                created_by=user
-            )
+        # the locked rows, not the callers' instances: a concurrent edit may have moved po_quantity and its hold
+        candidates = _lock_pending(requests)
+        locked = {req.pk for req in candidates}
+        errors = {req.pk: "Already processed" for req in requests if req.pk not in locked}
+
+        _, line_errors = record_batch(
+            [
+                {
+                    "item": req.stock_item_id,
+                    "movement_type": "OUT",
+                    "quantity": req.po_quantity,
+                    "reference": f"MR-{req.pk}",
+                    "remarks": "Deduct stock for approved request",
+                    "reserved": True,
+                }
+                for req in candidates
+            ],
+            user=user,
+            atomic=atomic,
+        )
+        for error in line_errors:
+            errors[candidates[error["line"]].pk] = error["error"]
+        if errors and atomic:
+            raise LedgerError("; ".join(errors.values()))
+
+        approved = [req for req in candidates if req.pk not in errors]
+        if approved:
+            stamp = now()
+            MaterialRequest.objects.filter(pk__in=[req.pk for req in approved]).update(status="APPROVED", updated_at=stamp)
+            for req in approved:
+                req.status, req.updated_at = "APPROVED", stamp
+            domain.dispatch("material_requests.approved", requests=approved, user=user)
+    return approved, errors
+
+
+def reject_requests(requests, user: User = None):
+    """Reject the PENDING requests among requests. Returns (rejected, errors) like approve_requests."""
+    from core import domain
+
+    with transaction.atomic():
+        rejected = _lock_pending(requests)
+        locked = {req.pk for req in rejected}
+        errors = {req.pk: "Already processed" for req in requests if req.pk not in locked}
+        if rejected:
+            stamp = now()
+            MaterialRequest.objects.filter(pk__in=locked).update(status="REJECTED", updated_at=stamp)
+            for req in rejected:
+                req.status, req.updated_at = "REJECTED", stamp
+            domain.dispatch("material_requests.rejected", requests=rejected, user=user)
+    return rejected, errors
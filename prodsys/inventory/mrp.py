@@ -0,0 +1,116 @@
+import numpy as np
+from django.core.exceptions import ValidationError
+
+from .bom import MAX_DEPTH
+from .models import InventoryItem, BillOfMaterial
+
+
+def _text(value):
+    return f"{value:.2f}"
+
+
+def _structure(products):
+    """
+    BOM lines below products as (parents, children, per-unit quantities), loaded one query per level,
+    with every item id involved and its low-level code: the deepest level it is used at.
+    """
+    lines = []
+    frontier = set(products)
+    loaded = set()
+    for _ in range(MAX_DEPTH):
+        if not frontier:
+            break
+        rows = list(BillOfMaterial.objects.filter(finished_item__in=frontier).values_list("finished_item", "raw_item", "quantity_required"))
+        loaded |= frontier
+        lines += rows
+        frontier = {raw_id for _, raw_id, _ in rows} - loaded
+    if frontier:
+        raise ValidationError("Bill of material is nested deeper than %d levels" % MAX_DEPTH)
+
+    bom = np.array(lines, dtype=float).reshape(-1, 3)
+    ids = np.union1d(products, bom[:, :2].astype(np.int64).ravel())
+    parents = np.searchsorted(ids, bom[:, 0].astype(np.int64))
+    children = np.searchsorted(ids, bom[:, 1].astype(np.int64))
+
+    # push every child below its deepest parent until nothing moves
+    levels = np.zeros(len(ids), dtype=np.int64)
+    for _ in range(MAX_DEPTH):
+        deeper = levels.copy()
+        np.maximum.at(deeper, children, levels[parents] + 1)
+        if np.array_equal(deeper, levels):
+            break
+        levels = deeper
+    else:
+        raise ValidationError("Bill of material is circular")
+    return ids, parents, children, bom[:, 2], levels
+
+
+def run_mrp(plan):
+    """
+    Explode planned production through the BOMs level by level and net it against stock.
+    plan is a list of (item id, quantity) jobs; an item may appear in many jobs.
+    The planned quantities are built as given. Below them every BOM node, raw material, WIP or
+    sub-assembly, is netted against its own stock once its low-level code comes up, after all its
+    parents, and only the net of a built node is exploded into its components.
+    Stock reserved by pending MaterialRequests is already promised elsewhere, so it is not available.
+    Returns {"feasible", "without_bom", "requirements"} with one requirement row per component,
+    largest shortfall first: build is what a node with a BOM still has to be made of, shortfall what a
+    bought item is missing. without_bom lists planned items that have nothing to explode.
+    """
+    if not plan:
+        return {"feasible": True, "without_bom": [], "requirements": []}
+
+    job_items = np.array([item_id for item_id, _ in plan], dtype=np.int64)
+    job_quantities = np.array([quantity for _, quantity in plan], dtype=float)
+    products, product_index = np.unique(job_items, return_inverse=True)
+    planned_products = np.bincount(product_index, weights=job_quantities, minlength=len(products))
+
+    ids, parents, children, per_unit, levels = _structure(products)
+    without_bom = np.setdiff1d(products, ids[parents]).tolist()
+    if not len(parents):
+        return {"feasible": True, "without_bom": without_bom, "requirements": []}
+
+    stock = {row[0]: row[1:] for row in InventoryItem.objects.filter(pk__in=ids.tolist()).values_list("pk", "code", "name", "uom", "quantity", "reserved")}
+    on_hand = np.array([float(stock[pk][3]) for pk in ids.tolist()])
+    requested = np.array([float(stock[pk][4]) for pk in ids.tolist()])
+    available = np.maximum(on_hand - requested, 0)
+
+    planned = np.zeros(len(ids))
+    planned[np.searchsorted(ids, products)] = planned_products
+    # gross dependent demand, complete for a level once every level above it has exploded
+    gross = np.zeros(len(ids))
+    made = np.zeros(len(ids))
+    for level in range(levels.max() + 1):
+        here = levels == level
+        made[here] = planned[here] + np.maximum(gross[here] - available[here], 0)
+        exploding = here[parents]
+        gross += np.bincount(children[exploding], weights=made[parents[exploding]] * per_unit[exploding], minlength=len(ids))
+
+    net = np.maximum(gross - available, 0)
+    has_bom = np.zeros(len(ids), dtype=bool)
+    has_bom[parents] = True
+    build = np.round(np.where(has_bom, net, 0), 2)
+    shortfall = np.round(np.where(has_bom, 0, net), 2)
+
+    components = np.unique(children).tolist()
+    code = {i: stock[int(ids[i])][0] for i in components}
+    requirements = [
+        {
+            "item": int(ids[i]),
+            "code": code[i],
+            "name": stock[int(ids[i])][1],
+            "uom": stock[int(ids[i])][2],
+            "gross": _text(gross[i]),
+            "on_hand": _text(on_hand[i]),
+            "requested": _text(requested[i]),
+            "available": _text(available[i]),
+            "build": _text(build[i]),
+            "shortfall": _text(shortfall[i]),
+        }
+        for i in sorted(components, key=lambda i: (-shortfall[i], -build[i], code[i]))
+    ]
+    return {
+        "feasible": not bool(shortfall.any()),
+        "without_bom": without_bom,
+        "requirements": requirements,
+    }
@@ -0,0 +1,152 @@
+"""
+Optional monthly range partitioning of the stock movement ledger, PostgreSQL only.
+
+With STOCK_MOVEMENT_PARTITIONING on, migration 0013 turns inventory_stockmovement into a table
+partitioned by timestamp: one partition per month from the oldest movement up to
+STOCK_MOVEMENT_PARTITIONS_AHEAD months from now, and a default partition that catches anything
+outside them. The partition_stock_movements command keeps creating the months ahead.
+Queries bounded on timestamp only read the partitions they overlap; the model does not change.
+
+The primary key of a partitioned table has to include the partition key, so it becomes
+(id, timestamp); ids still come from one sequence and stay unique.
+"""
+from datetime import date
+
+from django.conf import settings
+from django.utils.timezone import now
+
+TABLE = "inventory_stockmovement"
+DEFAULT_PARTITION = TABLE + "_default"
+SEQUENCE = TABLE + "_id_seq"
+
+
+def enabled():
+    return getattr(settings, "STOCK_MOVEMENT_PARTITIONING", False)
+
+
+def months_ahead():
+    return getattr(settings, "STOCK_MOVEMENT_PARTITIONS_AHEAD", 3)
+
+
+def add_months(month, count):
+    years, index = divmod(month.month - 1 + count, 12)
+    return date(month.year + years, index + 1, 1)
+
+
+def partition_name(month):
+    return f"{TABLE}_y{month.year}m{month.month:02d}"
+
+
+def is_partitioned(cursor):
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [TABLE])
+    row = cursor.fetchone()
+    return row is not None and row[0] == "p"
+
+
+def partitions(cursor):
+    """Names of the monthly partitions, oldest first."""
+    cursor.execute(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(%s) AND c.relname <> %s ORDER BY c.relname",
+        [TABLE, DEFAULT_PARTITION],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def create_partitions(cursor, first, last):
+    """
+    Create the missing monthly partitions from the month of first to the month of last.
+    Rows the default partition already holds for such a month are moved into it before it is
+    attached, otherwise the attach would fail. Returns the names created.
+    """
+    created = []
+    month = date(first.year, first.month, 1)
+    while month <= last:
+        name = partition_name(month)
+        cursor.execute("SELECT to_regclass(%s)", [name])
+        if cursor.fetchone()[0] is None:
+            bounds = [f"{month.isoformat()} 00:00:00+00", f"{add_months(month, 1).isoformat()} 00:00:00+00"]
+            cursor.execute(f'CREATE TABLE "{name}" (LIKE "{TABLE}" INCLUDING DEFAULTS)')
+            cursor.execute(
+                f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" WHERE timestamp >= %s AND timestamp < %s RETURNING *) '
+                f'INSERT INTO "{name}" SELECT * FROM moved',
+                bounds,
+            )
+            cursor.execute(f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{name}" FOR VALUES FROM (%s) TO (%s)', bounds)
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def maintain(cursor, ahead=None):
+    """
+    Create the partitions from this month to ahead months out, plus the month of every row that
+    landed in the default partition because its month was missing. Returns the names created.
+    """
+    today = now().date()
+    created = create_partitions(cursor, today, add_months(today, months_ahead() if ahead is None else ahead))
+    cursor.execute(f"SELECT DISTINCT date_trunc('month', timestamp AT TIME ZONE 'UTC')::date FROM \"{DEFAULT_PARTITION}\"")
+    for (month,) in sorted(cursor.fetchall()):
+        created += create_partitions(cursor, month, month)
+    return created
+
+
+def _definitions(cursor):
+    """CREATE INDEX statements and foreign keys of the table, without its primary key."""
+    cursor.execute(
+        "SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s "
+        "AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'p')",
+        [TABLE, TABLE],
+    )
+    indexes = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'f'", [TABLE])
+    return indexes, cursor.fetchall()
+
+
+def _restore(cursor, primary_key, indexes, foreign_keys):
+    # built once over the copied rows instead of being maintained row by row during the copy
+    cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_pkey" PRIMARY KEY ({primary_key})')
+    for statement in indexes:
+        cursor.execute(statement)
+    for name, definition in foreign_keys:
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{name}" {definition}')
+    cursor.execute(f'ALTER SEQUENCE "{SEQUENCE}" OWNED BY "{TABLE}".id')
+    cursor.execute(f'ALTER TABLE "{TABLE}" ALTER COLUMN id SET DEFAULT nextval(\'"{SEQUENCE}"\'::regclass)')
+
+
+def _copy_into_new_table(cursor, old, partition_clause):
+    indexes, foreign_keys = _definitions(cursor)
+    cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{old}"')
+    # the old table's id sequence goes when it is dropped, keep the numbering in a standalone one
+    cursor.execute(f'SELECT COALESCE(MAX(id), 0) + 1, MIN(timestamp) FROM "{old}"')
+    next_id, oldest = cursor.fetchone()
+    cursor.execute(f'CREATE TABLE "{TABLE}" (LIKE "{old}") {partition_clause}')
+    return indexes, foreign_keys, next_id, oldest
+
+
+def partition_table(cursor, ahead=None):
+    """Rebuild the movement table as a monthly partitioned table, keeping every row, index and foreign key."""
+    if is_partitioned(cursor):
+        return
+    old = TABLE + "_unpartitioned"
+    indexes, foreign_keys, next_id, oldest = _copy_into_new_table(cursor, old, "PARTITION BY RANGE (timestamp)")
+    cursor.execute(f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF "{TABLE}" DEFAULT')
+    today = now().date()
+    create_partitions(cursor, (oldest or now()).date(), add_months(today, months_ahead() if ahead is None else ahead))
+    cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{old}"')
+    cursor.execute(f'DROP TABLE "{old}"')
+    cursor.execute(f'CREATE SEQUENCE "{SEQUENCE}" START WITH {next_id}')
+    _restore(cursor, "id, timestamp", indexes, foreign_keys)
+
+
+def unpartition_table(cursor):
+    """Undo partition_table: copy every row back into one plain table."""
+    if not is_partitioned(cursor):
+        return
+    old = TABLE + "_partitioned"
+    indexes, foreign_keys, _, _ = _copy_into_new_table(cursor, old, "")
+    cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{old}"')
+    # the sequence belongs to the partitioned table's id, move it before that table is dropped
+    cursor.execute(f'ALTER SEQUENCE "{SEQUENCE}" OWNED BY "{TABLE}".id')
+    cursor.execute(f'DROP TABLE "{old}"')
+    _restore(cursor, "id", indexes, foreign_keys)
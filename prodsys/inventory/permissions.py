@@ -9,28 +9,32 @@ class InventoryPermission(permissions.BasePermission):
             "list": True, "retrieve": True,
             "create": False, "update": False, "partial_update": False, "delete": False,
 
-            "stock_in": True, "stock_out": True,
+            "stock_in": True, "stock_out": True, "low_stock": True, "forecast": True,
+            "import_items": False, "export": True, "valuation": False,
             "adjust": False, "transfer": False,
         },
         "SUPERVISOR": {
             "list": True, "retrieve": True,
             "create": False, "update": False, "partial_update": False, "delete": False,
 
-            "stock_in": True, "stock_out": True,
+            "stock_in": True, "stock_out": True, "low_stock": True, "forecast": True,
+            "import_items": False, "export": True, "valuation": False,
             "adjust": False, "transfer": False,
         },
         "MANAGER": {
             "list": True, "retrieve": True,
             "create": True, "update": True, "partial_update": True, "delete": True,
 
-            "stock_in": True, "stock_out": True,
+            "stock_in": True, "stock_out": True, "low_stock": True, "forecast": True,
+            "import_items": True, "export": True, "valuation": True,
             "adjust": True, "transfer": True,
         },
         "ADMIN": {
             "list": True, "retrieve": True,
             "create": True, "update": True, "partial_update": True, "delete": True,
 
-            "stock_in": True, "stock_out": True,
+            "stock_in": True, "stock_out": True, "low_stock": True, "forecast": True,
+            "import_items": True, "export": True, "valuation": True,
             "adjust": True, "transfer": True,
         },
     }
@@ -42,6 +46,11 @@ class InventoryPermission(permissions.BasePermission):
         "delete": "delete", 
     }
 
+    @classmethod
+    def allows(cls, user, action_name):
+        role = get_user_role(user)
+        return cls.role_perms.get(role, {}).get(action_name, False)
+
     def has_permission(self, request, view):
         user = request.user
         if not user.is_authenticated:
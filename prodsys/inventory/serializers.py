@@ -1,33 +1,58 @@
+from decimal import Decimal
 from rest_framework import serializers
-from .models import InventoryItem, StockMovement, MaterialRequest
+from core.serializers import DynamicFieldsMixin
+from .models import InventoryItem, StockMovement, MaterialRequest, ItemForecast
 
-class InventoryItemSerializer(serializers.ModelSerializer):
+class InventoryItemSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     is_below_reorder = serializers.SerializerMethodField()
+    # a generated column maps to a plain read-only field, declare it so it renders like quantity
+    available = serializers.DecimalField(max_digits=13, decimal_places=2, read_only=True)
 
     class Meta:
         model = InventoryItem
         fields = [
             "id", "code", "name", "width", "length", "thickness", "gsm",
-            "weight", "description", "category", "uom", "quantity",
+            "weight", "description", "category", "uom", "quantity", "reserved", "available",
             "reorder_level", "last_updated", "is_below_reorder",
         ]
-        read_only_fields = ["id", "last_updated", "is_below_reorder"]
+        read_only_fields = ["id", "reserved", "available", "last_updated", "is_below_reorder"]
+
+    def validate_quantity(self, value):
+        # quantity is the opening stock of a new item, booked as an ADJUST; after that only the ledger moves it
+        if self.instance is not None and value != self.instance.quantity:
+            raise serializers.ValidationError("Move stock with stock_in, stock_out or adjust")
+        if value < 0:
+            raise serializers.ValidationError("Opening stock cannot be negative")
+        return value
 
     def get_is_below_reorder(self, obj):
         result = obj.is_below_reorder()
         return result
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # with ?as_of= the quantity is the historical balance, not the live one
+        if hasattr(instance, "balance_as_of"):
+            if "quantity" in data:
+                data["quantity"] = self.fields["quantity"].to_representation(instance.balance_as_of)
+            if "is_below_reorder" in data:
+                data["is_below_reorder"] = instance.balance_as_of <= instance.reorder_level
+            data["as_of"] = self.context["request"].query_params.get("as_of")
+        return data
+
 
-class StockMovementSerializer(serializers.ModelSerializer):
+class StockMovementSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    item_code = serializers.CharField(source="item.code", read_only=True)
     item_detail = InventoryItemSerializer(source="item", read_only=True)
 
     class Meta:
         model = StockMovement
         fields = [
-            "id", "item", "item_detail", "movement_type", "quantity",
+            "id", "item", "item_code", "item_detail", "movement_type", "quantity", "unit_cost",
             "reference", "remarks", "timestamp", "created_by",
         ]
-        read_only_fields = ["id", "timestamp", "created_by"]
+        read_only_fields = ["id", "item_code", "unit_cost", "timestamp", "created_by"]
+        nested_fields = ["item_detail"]
 
 
 class StockBaseActionSerializer(serializers.Serializer):
@@ -37,6 +62,8 @@ class StockBaseActionSerializer(serializers.Serializer):
 
 class StockInSerializer(StockBaseActionSerializer):
     quantity = serializers.DecimalField(max_digits=12, decimal_places=2)
+    # without a cost the stock comes in at the item's latest cost
+    unit_cost = serializers.DecimalField(max_digits=14, decimal_places=4, min_value=0, required=False, allow_null=True)
 
     def validate(self, data):
         q = data.get("quantity")
@@ -82,15 +109,117 @@ class StockTransferSerializer(StockBaseActionSerializer):
         return q
 
 
-class MaterialRequestSerializer(serializers.ModelSerializer):
+class StockMovementLineSerializer(serializers.Serializer):
+    item = serializers.IntegerField(min_value=1)
+    movement_type = serializers.ChoiceField(choices=["IN", "OUT", "ADJUST"])
+    quantity = serializers.DecimalField(max_digits=12, decimal_places=2)
+    unit_cost = serializers.DecimalField(max_digits=14, decimal_places=4, min_value=0, required=False, allow_null=True)
+    reference = serializers.CharField(required=False, allow_blank=True, allow_null=True, max_length=100)
+    remarks = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
+
+class StockMovementBatchSerializer(serializers.Serializer):
+    MODES = ["all_or_nothing", "best_effort"]
+
+    mode = serializers.ChoiceField(choices=MODES, default="all_or_nothing")
+    lines = serializers.ListField(child=serializers.DictField(), allow_empty=False, max_length=10000)
+
+    def split_lines(self):
+        # one reusable line serializer instead of a nested serializer per line
+        line_serializer = StockMovementLineSerializer()
+        valid, errors = [], []
+        for index, raw in enumerate(self.validated_data["lines"]):
+            try:
+                valid.append((index, line_serializer.run_validation(raw)))
+            except serializers.ValidationError as e:
+                errors.append({"line": index, "error": e.detail})
+        return valid, errors
+
+
+class MaterialRequestSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     requested_by = serializers.StringRelatedField(read_only=True)
 
     class Meta:
         model = MaterialRequest
         fields = ["id", "requested_by", "stock_item", "po_quantity", "status", "created_at", "updated_at"]
-        read_only_fields = ["created_at", "updated_at", "requested_by"]
+        # status only moves through the approve / reject actions, which take the stock out
+        read_only_fields = ["status", "created_at", "updated_at", "requested_by"]
 
     def validate_po_quantity(self, value):
         if value <= 0:
             raise serializers.ValidationError("PO quantity must be greater than zero.")
         return value
+
+
+class MaterialRequestBulkSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=500)
+
+    def validate_ids(self, value):
+        # a repeated id is one request, keep the first position
+        return list(dict.fromkeys(value))
+
+
+class InventoryItemImportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = InventoryItem
+        fields = [
+            "code", "name", "category", "uom", "width", "length", "thickness",
+            "gsm", "weight", "description", "reorder_level",
+        ]
+        # imports upsert on code, so an existing code is not an error
+        extra_kwargs = {"code": {"validators": []}}
+
+
+class ItemForecastSerializer(serializers.ModelSerializer):
+    item_code = serializers.CharField(source="item.code", read_only=True)
+    item_name = serializers.CharField(source="item.name", read_only=True)
+    category = serializers.CharField(source="item.category", read_only=True)
+    quantity = serializers.DecimalField(source="item.quantity", max_digits=12, decimal_places=2, read_only=True)
+    reorder_level = serializers.DecimalField(source="item.reorder_level", max_digits=12, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = ItemForecast
+        fields = [
+            "item", "item_code", "item_name", "category", "quantity", "reorder_level",
+            "daily_rate", "daily_std", "days_of_cover", "suggested_reorder_level",
+            "window_days", "lead_time_days", "computed_at",
+        ]
+
+
+class MrpJobSerializer(serializers.Serializer):
+    item = serializers.IntegerField(min_value=1, required=False)
+    code = serializers.CharField(required=False, max_length=50)
+    quantity = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal("0.01"))
+
+    def validate(self, attrs):
+        if "item" not in attrs and "code" not in attrs:
+            raise serializers.ValidationError("Give the planned item as item (id) or code.")
+        return attrs
+
+
+class MrpPlanSerializer(serializers.Serializer):
+    jobs = serializers.ListField(child=serializers.DictField(), allow_empty=False, max_length=50000)
+
+    def plan(self):
+        """Validated jobs as (item id, quantity) pairs, codes resolved in one query, plus per-job errors."""
+        job_serializer = MrpJobSerializer()
+        valid, errors = [], []
+        for index, raw in enumerate(self.validated_data["jobs"]):
+            try:
+                valid.append((index, job_serializer.run_validation(raw)))
+            except serializers.ValidationError as e:
+                errors.append({"job": index, "error": e.detail})
+
+        codes = {job["code"] for _, job in valid if "item" not in job}
+        ids = {job["item"] for _, job in valid if "item" in job}
+        by_code = dict(InventoryItem.objects.filter(code__in=codes).values_list("code", "pk"))
+        known = set(InventoryItem.objects.filter(pk__in=ids).values_list("pk", flat=True))
+        plan = []
+        for index, job in valid:
+            item_id = job["item"] if "item" in job else by_code.get(job["code"])
+            if item_id is None or ("item" in job and item_id not in known):
+                errors.append({"job": index, "error": "Unknown item " + str(job.get("item", job.get("code")))})
+                continue
+            plan.append((item_id, job["quantity"]))
+        errors.sort(key=lambda error: error["job"])
+        return plan, errors
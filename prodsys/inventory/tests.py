@@ -1,3 +1,176 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import Sum
 from django.test import TestCase
+from rest_framework.test import APITestCase
+
+from .ledger import record_batch
+from .models import BillOfMaterial, CostLayer, InventoryItem, MaterialRequest, StockMovement
+from .mrp import run_mrp
+
+
+def make_item(code, quantity=0, unit_cost=None):
+    item = InventoryItem.objects.create(code=code, name=code, category="RAW")
+    if quantity:
+        record_batch([{"item": item.pk, "movement_type": "IN", "quantity": Decimal(quantity), "unit_cost": unit_cost}])
+        item.refresh_from_db()
+    return item
+
+
+class RecordBatchTests(TestCase):
+    def setUp(self):
+        self.item = make_item("RB-1", 10)
+
+    def test_atomic_batch_rejects_overdraw(self):
+        lines = [
+            {"item": self.item.pk, "movement_type": "OUT", "quantity": Decimal("6")},
+            {"item": self.item.pk, "movement_type": "OUT", "quantity": Decimal("6")},
+        ]
+        movements, errors = record_batch(lines)
+        self.assertEqual((movements, [error["line"] for error in errors]), ([], [1]))
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, Decimal("10"))
+        self.assertEqual(StockMovement.objects.filter(item=self.item, movement_type="OUT").count(), 0)
+
+    def test_non_atomic_batch_skips_overdrawing_lines(self):
+        lines = [
+            {"item": self.item.pk, "movement_type": "OUT", "quantity": Decimal("6")},
+            {"item": self.item.pk, "movement_type": "OUT", "quantity": Decimal("6")},
+            {"item": self.item.pk, "movement_type": "OUT", "quantity": Decimal("3")},
+        ]
+        movements, errors = record_batch(lines, atomic=False)
+        self.assertEqual(len(movements), 2)
+        self.assertEqual([error["line"] for error in errors], [1])
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, Decimal("1"))
+
+    def test_reserved_stock_only_goes_to_its_request(self):
+        InventoryItem.objects.filter(pk=self.item.pk).update(reserved=8)
+        _, errors = record_batch([{"item": self.item.pk, "movement_type": "OUT", "quantity": Decimal("5")}])
+        self.assertEqual(errors, [{"line": 0, "error": "Insufficient stock for RB-1"}])
+        record_batch([{"item": self.item.pk, "movement_type": "OUT", "quantity": Decimal("5"), "reserved": True}])
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, Decimal("5"))
+
+
+class CostLayerTests(TestCase):
+    def test_outgoing_stock_drains_the_oldest_layers_first(self):
+        item = make_item("FIFO-1", 5, Decimal("2"))
+        record_batch([{"item": item.pk, "movement_type": "IN", "quantity": Decimal("5"), "unit_cost": Decimal("4")}])
+
+        movements, _ = record_batch([{"item": item.pk, "movement_type": "OUT", "quantity": Decimal("7")}])
+
+        # 5 at 2 and 2 at 4
+        self.assertEqual(movements[0].unit_cost, (Decimal("18") / 7).quantize(Decimal("0.0001")))
+        remaining = list(CostLayer.objects.filter(item=item).order_by("id").values_list("remaining", flat=True))
+        self.assertEqual(remaining, [Decimal("0"), Decimal("3")])
+
+
+class MaterialRequestTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("manager", password="x", role="ADMIN")
+        self.client.force_authenticate(self.user)
+        self.item = make_item("MR-1", 10)
+
+    def request_stock(self, quantity, item=None):
+        response = self.client.post(
+            "/api/inventory/material-requests/",
+            {"stock_item": (item or self.item).pk, "po_quantity": quantity},
+            format="json",
+        )
+        return response
+
+    def test_pending_request_reserves_until_approved(self):
+        response = self.request_stock(6)
+        self.assertEqual(response.status_code, 201)
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.quantity, self.item.reserved), (Decimal("10"), Decimal("6")))
+
+        # the held stock is not available to a second request
+        self.assertEqual(self.request_stock(5).status_code, 400)
+
+        response = self.client.post(f"/api/inventory/material-requests/{response.data['id']}/approve/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["status"], "APPROVED")
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.quantity, self.item.reserved), (Decimal("4"), Decimal("0")))
+
+    def test_rejecting_releases_the_reservation(self):
+        pk = self.request_stock(6).data["id"]
+        response = self.client.post(f"/api/inventory/material-requests/{pk}/reject/")
+        self.assertEqual(response.status_code, 200)
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.quantity, self.item.reserved), (Decimal("10"), Decimal("0")))
+
+    def test_bulk_approve_reports_each_request(self):
+        first = self.request_stock(4).data["id"]
+        second = self.request_stock(3).data["id"]
+        done = self.request_stock(1).data["id"]
+        self.client.post(f"/api/inventory/material-requests/{done}/reject/")
+
+        response = self.client.post(
+            "/api/inventory/material-requests/bulk-approve/", {"ids": [first, done, 999999, second]}, format="json"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data["processed"], response.data["failed"]), (2, 2))
+        results = {row["id"]: row for row in response.data["results"]}
+        self.assertEqual(results[first]["status"], "APPROVED")
+        self.assertEqual(results[second]["status"], "APPROVED")
+        self.assertEqual((results[done]["status"], results[done]["error"]), ("REJECTED", "Already processed"))
+        self.assertEqual((results[999999]["status"], results[999999]["error"]), (None, "Not found"))
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.quantity, self.item.reserved), (Decimal("3"), Decimal("0")))
+
+    def test_bulk_approve_with_nothing_to_approve_is_a_bad_request(self):
+        pk = self.request_stock(4).data["id"]
+        self.client.post(f"/api/inventory/material-requests/{pk}/approve/")
+        response = self.client.post("/api/inventory/material-requests/bulk-approve/", {"ids": [pk]}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(MaterialRequest.objects.get(pk=pk).status, "APPROVED")
+
+
+class ReconcileStockTests(TestCase):
+    def reconcile(self):
+        err = StringIO()
+        call_command("reconcile_stock", "--fix", stdout=StringIO(), stderr=err)
+        return err.getvalue()
+
+    def test_fix_moves_quantity_and_cost_layers_to_the_ledger(self):
+        item = make_item("RC-1", 10, Decimal("2"))
+        InventoryItem.objects.filter(pk=item.pk).update(quantity=14)
+
+        self.reconcile()
+
+        item.refresh_from_db()
+        layered = CostLayer.objects.filter(item=item).aggregate(total=Sum("remaining"))["total"]
+        self.assertEqual((item.quantity, layered), (Decimal("10"), Decimal("10")))
+
+    def test_fix_leaves_a_ledger_below_reserved_alone(self):
+        item = make_item("RC-2", 10)
+        InventoryItem.objects.filter(pk=item.pk).update(quantity=12, reserved=11)
+
+        self.assertIn("RC-2 is below its 11.00 reserved", self.reconcile())
+
+        item.refresh_from_db()
+        self.assertEqual(item.quantity, Decimal("12"))
+
+
+class MrpTests(TestCase):
+    def test_stock_is_netted_at_every_bom_level(self):
+        finished = InventoryItem.objects.create(code="MRP-FG", category="FG")
+        wip = make_item("MRP-WIP", 4)
+        raw = make_item("MRP-RAW", 10)
+        BillOfMaterial.objects.create(finished_item=finished, raw_item=wip, quantity_required=2)
+        BillOfMaterial.objects.create(finished_item=wip, raw_item=raw, quantity_required=3)
+
+        result = run_mrp([(finished.pk, 5)])
 
-# Create your tests here.
+        rows = {row["code"]: row for row in result["requirements"]}
+        # 10 WIP needed, 4 in stock: 6 to build, 18 raw for them
+        self.assertEqual((rows["MRP-WIP"]["build"], rows["MRP-WIP"]["shortfall"]), ("6.00", "0.00"))
+        self.assertEqual((rows["MRP-RAW"]["gross"], rows["MRP-RAW"]["shortfall"]), ("18.00", "8.00"))
+        self.assertFalse(result["feasible"])
@@ -7,6 +7,9 @@ from .views import (
     MaterialRequestViewSet,
     InventoryDashboardAPIView,   # JSON API view
     InventoryDashboardPage,      # HTML dashboard
+    StockStreamView,             # server-sent events
+    MaterialRequirementsView,    # MRP run
+    InventoryValuationView,      # FIFO valuation
 )
 
 app_name = "inventory"
@@ -20,5 +23,8 @@ router.register(r"material-requests", MaterialRequestViewSet, basename="material
 urlpatterns = [
     path("dashboard/api/", login_required(InventoryDashboardAPIView.as_view()), name="inventory-dashboard-api"),  # JSON
     path("dashboard/", login_required(InventoryDashboardPage.as_view()), name="inventory-dashboard-page"),  # HTML
+    path("mrp/", MaterialRequirementsView.as_view(), name="inventory-mrp"),
+    path("valuation/", InventoryValuationView.as_view(), name="inventory-valuation"),
+    path("stream/", StockStreamView.as_view(), name="inventory-stream"),  # SSE
     path("", include(router.urls)),
 ]
@@ -0,0 +1,50 @@
+from django.db.models import DecimalField, F, Sum
+
+from .models import CostLayer
+
+VALUE = Sum(F("remaining") * F("unit_cost"), output_field=DecimalField(max_digits=28, decimal_places=6))
+
+
+def _text(value):
+    return f"{value or 0:.2f}"
+
+
+def open_layers(category=None, item=None):
+    layers = CostLayer.objects.filter(remaining__gt=0)
+    if category:
+        layers = layers.filter(item__category=category)
+    if item:
+        layers = layers.filter(item=item)
+    return layers
+
+
+def by_category(category=None, item=None):
+    """FIFO value of stock on hand per category, one aggregate over the open layers."""
+    rows = (
+        open_layers(category, item).values("item__category")
+        .annotate(quantity=Sum("remaining"), value=VALUE).order_by("item__category")
+    )
+    return [
+        {"category": row["item__category"], "quantity": _text(row["quantity"]), "value": _text(row["value"])}
+        for row in rows
+    ]
+
+
+def by_item(category=None, item=None, limit=100):
+    """FIFO value per item, highest value first; unit_cost is the average over the open layers."""
+    rows = (
+        open_layers(category, item).values("item", "item__code", "item__name", "item__category")
+        .annotate(quantity=Sum("remaining"), value=VALUE).order_by("-value", "item__code")[:limit]
+    )
+    return [
+        {
+            "item": row["item"],
+            "code": row["item__code"],
+            "name": row["item__name"],
+            "category": row["item__category"],
+            "quantity": _text(row["quantity"]),
+            "value": _text(row["value"]),
+            "unit_cost": f"{row['value'] / row['quantity']:.4f}",
+        }
+        for row in rows
+    ]
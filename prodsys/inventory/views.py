@@ -1,15 +1,33 @@
-from django.views.generic import TemplateView
+from django.views.generic import TemplateView, View
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.utils.timezone import now
-from django.db.models import Sum, F
+from django.utils.timezone import now, is_naive, make_aware
+from django.utils.dateparse import parse_date, parse_datetime
+from django.db import transaction
+from django.db.models import Sum, F, Q, Window, RowRange
+from django.http import StreamingHttpResponse, JsonResponse
+from django.core.serializers.json import DjangoJSONEncoder
 from rest_framework import viewsets, mixins, filters, status, decorators
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.parsers import MultiPartParser
 from rest_framework.views import APIView
+from rest_framework.exceptions import PermissionDenied, ValidationError, AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from asgiref.sync import sync_to_async
+from django_filters.rest_framework import DjangoFilterBackend
 from datetime import timedelta
-
-from .models import InventoryItem, StockMovement, MaterialRequest, deduct_stock
+from decimal import Decimal
+import asyncio
+import json
+
+from .models import InventoryItem, StockMovement, MaterialRequest, ItemForecast, movement_delta, approve_requests, reject_requests
+from .ledger import record_movement, record_batch, transfer_stock, LedgerError, InsufficientStock
+from .dashboard import get_snapshot
+from . import bulk
+from .mrp import run_mrp
+from . import valuation
+from .events import broker, movement_event
 from .serializers import (
     InventoryItemSerializer,
     StockMovementSerializer,
@@ -17,56 +35,176 @@ from .serializers import (
     StockOutSerializer,
     StockAdjustSerializer,
     StockTransferSerializer,
+    StockMovementBatchSerializer,
+    ItemForecastSerializer,
+    MrpPlanSerializer,
     MaterialRequestSerializer,
+    MaterialRequestBulkSerializer,
 )
-from .filters import InventoryItemFilter, StockMovementFilter
+from .filters import InventoryItemFilter, StockMovementFilter, InventorySearchFilter
+from .pagination import StockMovementCursorPagination
 from .permissions import InventoryPermission
 from accounts.utils import get_user_role
+from core import domain
+from core.idempotency import IdempotentMixin
 
 
-class InventoryItemViewSet(viewsets.ModelViewSet):
+class InventoryItemViewSet(IdempotentMixin, viewsets.ModelViewSet):
     queryset = InventoryItem.objects.all().order_by("code")
     serializer_class = InventoryItemSerializer
     permission_classes = [IsAuthenticated, InventoryPermission]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    # search runs last so its rank ordering is not replaced by the default ordering
+    filter_backends = [filters.OrderingFilter, InventorySearchFilter]
     filterset_class = InventoryItemFilter
     search_fields = ["code", "description", "name"]
     ordering_fields = ["code", "category", "quantity"]
     ordering = ["code"]
 
+    def perform_create(self, serializer):
+        opening = serializer.validated_data.pop("quantity", None)
+        with transaction.atomic():
+            item = serializer.save()
+            if opening:
+                # through the ledger, so the movement history and daily balances start from the opening stock
+                record_movement(item, "ADJUST", opening, reference="Opening stock", user=self.request.user)
+        domain.dispatch("inventory_items.changed", items=[item.pk])
+
+    def perform_update(self, serializer):
+        serializer.validated_data.pop("quantity", None)
+        item = serializer.save()
+        domain.dispatch("inventory_items.changed", items=[item.pk])
+
+    def perform_destroy(self, instance):
+        pk = instance.pk
+        instance.delete()
+        domain.dispatch("inventory_items.changed", items=[pk])
+
+    def get_as_of(self):
+        raw = self.request.query_params.get("as_of")
+        if not raw:
+            return None
+        try:
+            moment = parse_datetime(raw) if "T" in raw or " " in raw else parse_date(raw)
+        except ValueError:
+            moment = None
+        if moment is None:
+            raise ValidationError({"as_of": "Use YYYY-MM-DD or an ISO 8601 datetime."})
+        if hasattr(moment, "tzinfo") and is_naive(moment):
+            moment = make_aware(moment)
+        return moment
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if self.action in ("list", "retrieve"):
+            as_of = self.get_as_of()
+            if as_of is not None:
+                qs = qs.with_balance_as_of(as_of)
+        return qs
+
     def check_permission(self, action_name):
-        role = get_user_role(self.request.user)
-        perms = InventoryPermission.role_perms.get(role, {})
-        allowed = perms.get(action_name, False)
-        if allowed == False:
-            from rest_framework.exceptions import PermissionDenied
+        if not InventoryPermission.allows(self.request.user, action_name):
+            role = get_user_role(self.request.user)
             raise PermissionDenied("Role " + str(role) + " cannot do " + str(action_name))
 
+    # rows this recent may still belong to uncommitted writes, the feed leaves them for the next poll
+    low_stock_settle = timedelta(seconds=5)
+
+    @action(detail=False, methods=["get"], url_path="low-stock")
+    def low_stock(self, request):
+        """
+        Replenishment feed. Without ?since= it returns every item currently below reorder level;
+        with ?since=<next_since> it returns every item changed after that point, low or recovered,
+        so a client can upsert the low ones and drop the rest.
+        """
+        try:
+            limit = min(int(request.query_params.get("limit", 500)), 5000)
+        except ValueError:
+            raise ValidationError({"limit": "Must be an integer."})
+        settled = now() - self.low_stock_settle
+        since = request.query_params.get("since")
+
+        if not since:
+            items = list(InventoryItem.objects.filter(is_low_stock=True).order_by("code"))
+            next_since = f"{settled.isoformat()}|0"
+        else:
+            try:
+                stamp, last_id = since.rsplit("|", 1)
+                stamp, last_id = parse_datetime(stamp), int(last_id)
+            except ValueError:
+                stamp = None
+            if stamp is None:
+                raise ValidationError({"since": "Pass back the next_since value of the previous response."})
+            items = list(
+                InventoryItem.objects.filter(last_updated__lt=settled)
+                .filter(Q(last_updated__gt=stamp) | Q(last_updated=stamp, id__gt=last_id))
+                .order_by("last_updated", "id")[:limit]
+            )
+            next_since = f"{items[-1].last_updated.isoformat()}|{items[-1].id}" if items else since
+
+        return Response({"results": self.get_serializer(items, many=True).data, "next_since": next_since})
+
+    @action(detail=False, methods=["post"], url_path="import", parser_classes=[MultiPartParser])
+    def import_items(self, request):
+        """
+        Upsert items on code from an uploaded .csv or .ndjson file (multipart field "file").
+        Rows are validated and written in batches; rejected rows come back with their line number.
+        """
+        upload = request.FILES.get("file")
+        if upload is None:
+            raise ValidationError({"file": "Upload a .csv or .ndjson file."})
+        try:
+            fmt = bulk.file_format(upload.name, request.query_params.get("file_format"))
+        except ValueError as e:
+            raise ValidationError({"file_format": str(e)})
+        return Response(bulk.import_items(bulk.read_rows(upload, fmt)))
+
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        """Stream every item (after ?search= / ?ordering=) as CSV or NDJSON, ?gzip=1 to compress."""
+        try:
+            fmt = bulk.file_format("", request.query_params.get("file_format", "csv"))
+        except ValueError as e:
+            raise ValidationError({"file_format": str(e)})
+        rows = self.filter_queryset(self.get_queryset()).values_list(*bulk.EXPORT_FIELDS).iterator(chunk_size=2000)
+        writer = bulk.csv_stream if fmt == "csv" else bulk.ndjson_stream
+        return bulk.download(request, writer(bulk.EXPORT_FIELDS, rows), "inventory-items", fmt)
+
+    @action(detail=False, methods=["get"])
+    def forecast(self, request):
+        """
+        Latest forecast_stock results, items closest to running out first.
+        ?category= narrows it, ?max_cover=<days> keeps items covered for fewer days.
+        """
+        try:
+            limit = min(int(request.query_params.get("limit", 500)), 5000)
+            max_cover = request.query_params.get("max_cover")
+            max_cover = float(max_cover) if max_cover else None
+        except ValueError:
+            raise ValidationError({"detail": "limit and max_cover must be numbers."})
+
+        forecasts = ItemForecast.objects.select_related("item").order_by(F("days_of_cover").asc(nulls_last=True), "item__code")
+        category = request.query_params.get("category")
+        if category:
+            forecasts = forecasts.filter(item__category=category.upper())
+        if max_cover is not None:
+            forecasts = forecasts.filter(days_of_cover__lt=max_cover)
+        return Response(ItemForecastSerializer(forecasts[:limit], many=True).data)
+
     @action(detail=True, methods=["post"])
     def stock_in(self, request, pk=None):
         self.check_permission("stock_in")
         the_item = self.get_object()
         serializer = StockInSerializer(data=request.data)
-        valid = serializer.is_valid()
-        if not valid:
-            serializer.is_valid(raise_exception=True)
+        serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
-        qty = data["quantity"]
-        ref = data.get("reference", "")
-        rem = data.get("remarks", "")
-        old_qty = the_item.quantity
-        new_qty = old_qty + qty
-        the_item.quantity = new_qty
-        the_item.save(update_fields=["quantity", "last_updated"])
-
-        move = StockMovement()
-        move.item = the_item
-        move.movement_type = "IN"
-        move.quantity = qty
-        move.reference = ref
-        move.remarks = rem
-        move.created_by = request.user
-        move.save()
+        try:
+            record_movement(
+                the_item, "IN", data["quantity"],
+                reference=data.get("reference", ""), remarks=data.get("remarks", ""), user=request.user,
+                unit_cost=data.get("unit_cost"),
+            )
+        except LedgerError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         serialized = self.get_serializer(the_item)
         return Response(serialized.data)
@@ -78,24 +216,15 @@ class InventoryItemViewSet(viewsets.ModelViewSet):
         serializer = StockOutSerializer(data=request.data, context={"item": the_item})
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
-        qty = data["quantity"]
-        ref = data.get("reference", "")
-        rem = data.get("remarks", "")
-        old_qty = the_item.quantity
-        if old_qty < qty:
+        try:
+            record_movement(
+                the_item, "OUT", data["quantity"],
+                reference=data.get("reference", ""), remarks=data.get("remarks", ""), user=request.user,
+            )
+        except InsufficientStock:
             return Response({"detail": "Not enough stock"}, status=status.HTTP_400_BAD_REQUEST)
-        new_qty = old_qty - qty
-        the_item.quantity = new_qty
-        the_item.save(update_fields=["quantity", "last_updated"])
-
-        move = StockMovement()
-        move.item = the_item
-        move.movement_type = "OUT"
-        move.quantity = qty
-        move.reference = ref
-        move.remarks = rem
-        move.created_by = request.user
-        move.save()
+        except LedgerError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         serialized = self.get_serializer(the_item)
         return Response(serialized.data)
@@ -106,24 +235,14 @@ class InventoryItemViewSet(viewsets.ModelViewSet):
         the_item = self.get_object()
         serializer = StockAdjustSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        delta = serializer.validated_data["delta"]
-        ref = serializer.validated_data.get("reference", "")
-        rem = serializer.validated_data.get("remarks", "")
-        old_qty = the_item.quantity
-        new_qty = old_qty + delta
-        if new_qty < 0:
+        data = serializer.validated_data
+        try:
+            record_movement(
+                the_item, "ADJUST", data["delta"],
+                reference=data.get("reference", ""), remarks=data.get("remarks", ""), user=request.user,
+            )
+        except InsufficientStock:
             return Response({"detail": "Resulting quantity negative"}, status=status.HTTP_400_BAD_REQUEST)
-        the_item.quantity = new_qty
-        the_item.save(update_fields=["quantity", "last_updated"])
-
-        move = StockMovement()
-        move.item = the_item
-        move.movement_type = "ADJUST"
-        move.quantity = delta
-        move.reference = ref
-        move.remarks = rem
-        move.created_by = request.user
-        move.save()
 
         serialized = self.get_serializer(the_item)
         return Response(serialized.data)
@@ -135,136 +254,258 @@ class InventoryItemViewSet(viewsets.ModelViewSet):
         serializer = StockTransferSerializer(data=request.data, context={"item": from_item})
         serializer.is_valid(raise_exception=True)
         to_item = serializer.validated_data["to_item"]
-        qty = serializer.validated_data["quantity"]
-        ref = serializer.validated_data.get("reference", "")
-        rem = serializer.validated_data.get("remarks", "")
-        old_from_qty = from_item.quantity
-        old_to_qty = to_item.quantity
-        if from_item.id == to_item.id:
-            return Response({"detail": "Cannot transfer to same item"}, status=status.HTTP_400_BAD_REQUEST)
-        if old_from_qty < qty:
+        try:
+            transfer_stock(
+                from_item, to_item, serializer.validated_data["quantity"],
+                reference=serializer.validated_data.get("reference", ""), user=request.user,
+            )
+        except InsufficientStock:
             return Response({"detail": "Not enough stock to transfer"}, status=status.HTTP_400_BAD_REQUEST)
-        new_from_qty = old_from_qty - qty
-        from_item.quantity = new_from_qty
-        from_item.save(update_fields=["quantity", "last_updated"])
-        move_out = StockMovement()
-        move_out.item = from_item
-        move_out.movement_type = "TRANSFER"
-        move_out.quantity = -qty
-        move_out.reference = ref
-        move_out.remarks = "To " + str(to_item.code)
-        move_out.created_by = request.user
-        move_out.save()
-
-        new_to_qty = old_to_qty + qty
-        to_item.quantity = new_to_qty
-        to_item.save(update_fields=["quantity", "last_updated"])
-        move_in = StockMovement()
-        move_in.item = to_item
-        move_in.movement_type = "TRANSFER"
-        move_in.quantity = qty
-        move_in.reference = ref
-        move_in.remarks = "From " + str(from_item.code)
-        move_in.created_by = request.user
-        move_in.save()
+        except LedgerError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response({"from": InventoryItemSerializer(from_item).data, "to": InventoryItemSerializer(to_item).data})
 
 
-class MaterialRequestViewSet(viewsets.ModelViewSet):
+class MaterialRequestViewSet(IdempotentMixin, viewsets.ModelViewSet):
     queryset = MaterialRequest.objects.select_related("requested_by", "stock_item").all()
     serializer_class = MaterialRequestSerializer
     permission_classes = [IsAuthenticated]
 
+    # a PENDING request holds its quantity as reserved stock until it is approved, rejected or deleted
     def perform_create(self, serializer):
-        serializer.save(requested_by=self.request.user)
+        with transaction.atomic():
+            req = serializer.save(requested_by=self.request.user)
+            self.dispatch_reservation("material_requests.created", requests=[req])
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            previous = MaterialRequest.objects.select_for_update().get(pk=serializer.instance.pk)
+            if previous.status != "PENDING":
+                raise ValidationError({"detail": "Only pending requests can be changed"})
+            req = serializer.save()
+            self.dispatch_reservation("material_requests.updated", requests=[req], previous=[previous])
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            previous = MaterialRequest.objects.select_for_update().get(pk=instance.pk)
+            instance.delete()
+            if previous.status == "PENDING":
+                self.dispatch_reservation("material_requests.deleted", requests=[previous])
+
+    def dispatch_reservation(self, event, **payload):
+        try:
+            domain.dispatch(event, user=self.request.user, **payload)
+        except LedgerError as e:
+            raise ValidationError({"po_quantity": str(e)})
 
     @action(detail=True, methods=["post"])
     def approve(self, request, pk=None):
         req = self.get_object()
-        status_now = req.status
-        if status_now != "PENDING":
-            return Response({"detail": "Already processed"}, status=status.HTTP_400_BAD_REQUEST)
-        item = req.stock_item
-        qty = req.po_quantity
-        old_qty = item.quantity
-        if old_qty < qty:
-            return Response({"detail": "Not enough stock for " + str(item.code)}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            deduct_stock({item.id: qty}, reference="Req " + str(req.id), user=request.user)
-        except Exception as e:
+            approve_requests([req], user=request.user)
+        except LedgerError as e:
             return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
-        req.status = "APPROVED"
-        req.save(update_fields=["status", "updated_at"])
+        req.refresh_from_db()
         return Response(self.get_serializer(req).data)
 
     @action(detail=True, methods=["post"])
     def reject(self, request, pk=None):
         req = self.get_object()
-        status_now = req.status
-        if status_now != "PENDING":
-            return Response({"detail": "Already processed"}, status=status.HTTP_400_BAD_REQUEST)
-        req.status = "REJECTED"
-        req.save(update_fields=["status", "updated_at"])
+        _, errors = reject_requests([req], user=request.user)
+        if errors:
+            return Response({"detail": errors[req.pk]}, status=status.HTTP_400_BAD_REQUEST)
+        req.refresh_from_db()
         return Response(self.get_serializer(req).data)
 
-
-class StockMovementViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
-    queryset = StockMovement.objects.select_related("item").order_by("-timestamp")
+    def bulk_outcomes(self, request, decide):
+        serializer = MaterialRequestBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data["ids"]
+        found = {req.pk: req for req in self.get_queryset().filter(pk__in=ids)}
+        done, errors = decide(list(found.values()))
+        done = {req.pk: req for req in done}
+
+        results = []
+        for pk in ids:
+            if pk in done:
+                results.append({"id": pk, "status": done[pk].status})
+            else:
+                results.append({"id": pk, "status": found[pk].status if pk in found else None, "error": errors.get(pk, "Not found")})
+        return Response(
+            {"processed": len(done), "failed": len(ids) - len(done), "results": results},
+            status=status.HTTP_200_OK if done else status.HTTP_400_BAD_REQUEST,
+        )
+
+    @action(detail=False, methods=["post"], url_path="bulk-approve")
+    def bulk_approve(self, request):
+        """
+        Approve many requests at once; requests that cannot be served stay PENDING and are reported
+        per id, the rest are approved and deducted in one batch.
+        """
+        return self.bulk_outcomes(request, lambda reqs: approve_requests(reqs, user=request.user, atomic=False))
+
+    @action(detail=False, methods=["post"], url_path="bulk-reject")
+    def bulk_reject(self, request):
+        return self.bulk_outcomes(request, lambda reqs: reject_requests(reqs, user=request.user))
+
+
+class StockMovementViewSet(IdempotentMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    queryset = StockMovement.objects.select_related("item").order_by("-timestamp", "-id")
     serializer_class = StockMovementSerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [filters.OrderingFilter]
+    pagination_class = StockMovementCursorPagination
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_class = StockMovementFilter
-    ordering_fields = ["timestamp", "quantity", "movement_type"]
-    ordering = ["-timestamp"]
+    # cursor pagination needs a stable key, so only the timestamp direction can change
+    ordering_fields = ["timestamp"]
+    ordering = ["-timestamp", "-id"]
+
+    # movement type -> InventoryPermission action
+    batch_actions = {"IN": "stock_in", "OUT": "stock_out", "ADJUST": "adjust"}
+
+    @decorators.action(detail=False, methods=["post"])
+    def batch(self, request):
+        serializer = StockMovementBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        atomic = serializer.validated_data["mode"] == "all_or_nothing"
+        valid, errors = serializer.split_lines()
+
+        for movement_type in sorted({line["movement_type"] for _, line in valid}):
+            action_name = self.batch_actions[movement_type]
+            if not InventoryPermission.allows(request.user, action_name):
+                raise PermissionDenied("Role " + str(get_user_role(request.user)) + " cannot do " + action_name)
+
+        if errors and atomic:
+            return Response({"created": 0, "results": [], "errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        lines = [line for _, line in valid]
+        movements, ledger_errors = record_batch(lines, user=request.user, atomic=atomic)
+        # ledger errors point into the valid lines, map them back to request positions
+        for error in ledger_errors:
+            error["line"] = valid[error["line"]][0]
+        errors = sorted(errors + ledger_errors, key=lambda e: e["line"])
+
+        results = [
+            {"id": move.id, "item": move.item_id, "movement_type": move.movement_type, "quantity": str(move.quantity)}
+            for move in movements
+        ]
+        return Response(
+            {"created": len(movements), "results": results, "errors": errors},
+            status=status.HTTP_201_CREATED if movements else status.HTTP_400_BAD_REQUEST,
+        )
+
+    export_fields = ["id", "timestamp", "item__code", "movement_type", "quantity", "unit_cost", "reference", "remarks", "created_by__username"]
+    export_header = ["id", "timestamp", "item_code", "movement_type", "quantity", "unit_cost", "reference", "remarks", "created_by"]
+
+    @decorators.action(detail=False, methods=["get"])
+    def export(self, request):
+        """
+        The filtered ledger as CSV, streamed off a server-side cursor so memory stays flat
+        whatever the date range. Takes the list filters; ?gzip=1 compresses it.
+        """
+        rows = self.filter_queryset(self.get_queryset()).values_list(*self.export_fields).iterator(chunk_size=5000)
+        return bulk.download(request, bulk.csv_stream(self.export_header, rows), "stock-movements", "csv")
 
     @decorators.action(detail=True, methods=["get"])
     def trace(self, request, pk=None):
         move = self.get_object()
         item = move.item
-        history = StockMovement.objects.filter(item=item).order_by("timestamp")
-        serialized_move = StockMovementSerializer(move).data
-        serialized_history = StockMovementSerializer(history, many=True).data
-        return Response({"movement": serialized_move, "item": item.name, "history": serialized_history})
+        fields = ["id", "movement_type", "quantity", "reference", "remarks", "timestamp", "created_by"]
+        # running balance is computed by the database, rows are streamed off a server-side cursor
+        history = (
+            StockMovement.objects.filter(item=item)
+            .order_by("timestamp", "id")
+            .annotate(balance=Window(Sum(movement_delta()), order_by=[F("timestamp").asc(), F("id").asc()], frame=RowRange(None, 0)))
+            .values_list(*fields, "balance")
+        )
+        header = {
+            "movement": {
+                "id": move.id,
+                "movement_type": move.movement_type,
+                "quantity": move.quantity,
+                "reference": move.reference,
+                "remarks": move.remarks,
+                "timestamp": move.timestamp,
+                "created_by": move.created_by_id,
+            },
+            "item": InventoryItemSerializer(item).data,
+        }
 
+        def stream():
+            yield json.dumps(header, cls=DjangoJSONEncoder)[:-1] + ', "history": ['
+            chunk = []
+            for index, row in enumerate(history.iterator(chunk_size=2000)):
+                chunk.append(("," if index else "") + json.dumps(dict(zip(fields + ["balance"], row)), cls=DjangoJSONEncoder))
+                if len(chunk) == 500:
+                    yield "".join(chunk)
+                    chunk = []
+            yield "".join(chunk) + "]}"
 
-class InventoryDashboardAPIView(APIView):
+        return bulk.streaming_response(request, stream(), content_type="application/json")
+
+
+class MaterialRequirementsView(APIView):
+    """
+    POST {"jobs": [{"item": id | "code": code, "quantity": n}, ...]} to see whether the plan
+    can be built from stock and what has to be bought.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = MrpPlanSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        plan, errors = serializer.plan()
+        if errors:
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(run_mrp(plan))
+
+class InventoryValuationView(APIView):
+    """
+    FIFO value of stock on hand from the open cost layers.
+    Always returns the totals per category; with ?category= or ?item= it adds the items, highest value first.
+    """
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        today = now().date()
-        week_start = today - timedelta(days=today.weekday())
-        month_start = today.replace(day=1)
-        year_start = today.replace(month=1, day=1)
-
-        totals = InventoryItem.objects.values("category").annotate(total_qty=Sum("quantity")).order_by("category")
-        totals_by_cat = {}
-        for t in totals:
-            cat = t["category"]
-            qty = t["total_qty"]
-            if qty is None:
-                qty = 0
-            totals_by_cat[cat] = str(qty)
-
-        low_items = InventoryItem.objects.filter(quantity__lte=F("reorder_level"))
-        low_items_data = InventoryItemSerializer(low_items[:50], many=True).data
-
-        recent_moves = StockMovement.objects.select_related("item").order_by("-timestamp")[:10]
-        recent_serialized = StockMovementSerializer(recent_moves, many=True).data
-
-        def sum_moves(since):
-            q = StockMovement.objects.filter(timestamp__date__gte=since).values("movement_type").annotate(total=Sum("quantity"))
-            return list(q)
+        if not InventoryPermission.allows(request.user, "valuation"):
+            raise PermissionDenied("Role " + str(get_user_role(request.user)) + " cannot do valuation")
+        category = (request.query_params.get("category") or "").upper() or None
+        item = request.query_params.get("item")
+        try:
+            item = int(item) if item else None
+            limit = int(request.query_params.get("limit", 100))
+        except ValueError:
+            raise ValidationError({"detail": "item and limit must be integers."})
+        if limit < 1:
+            raise ValidationError({"limit": "Must be a positive integer."})
+        limit = min(limit, 1000)
+
+        categories = valuation.by_category(category, item)
+        data = {
+            "total_value": f"{sum(Decimal(row['value']) for row in categories):.2f}",
+            "categories": categories,
+        }
+        if category or item:
+            data["items"] = valuation.by_item(category, item, limit)
+        return Response(data)
 
+
+class InventoryDashboardAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        snapshot = get_snapshot()
+        totals = snapshot["movement_totals"]
         return Response({
-            "totals_by_category": totals_by_cat,
-            "low_stock_count": low_items.count(),
-            "low_stock_items": low_items_data,
-            "recent_movements": recent_serialized,
-            "daily_movements": sum_moves(today),
-            "weekly_movements": sum_moves(week_start),
-            "monthly_movements": sum_moves(month_start),
-            "yearly_movements": sum_moves(year_start),
+            "totals_by_category": {t["category"]: str(t["total_qty"] or 0) for t in snapshot["totals_by_category"]},
+            "low_stock_count": snapshot["low_stock_count"],
+            "low_stock_items": snapshot["low_stock_items"],
+            "recent_movements": snapshot["recent_movements"],
+            "daily_movements": totals["daily"],
+            "weekly_movements": totals["weekly"],
+            "monthly_movements": totals["monthly"],
+            "yearly_movements": totals["yearly"],
             "role": get_user_role(request.user),
         })
 
@@ -274,28 +515,18 @@ class InventoryDashboardPage(LoginRequiredMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        today = now().date()
-        start_week = today - timedelta(days=today.weekday())
-        start_month = today.replace(day=1)
-        start_year = today.replace(month=1, day=1)
-
-        def count_moves(since):
-            return StockMovement.objects.filter(timestamp__date__gte=since).count()
+        snapshot = get_snapshot()
+        counts = snapshot["movement_counts"]
 
-        totals = InventoryItem.objects.values("category").annotate(total_qty=Sum("quantity")).order_by("category")
-        context["totals_by_category"] = totals
+        context["totals_by_category"] = snapshot["totals_by_category"]
+        context["low_stock_count"] = snapshot["low_stock_count"]
+        context["low_stock_items"] = snapshot["low_stock_items"]
+        context["recent_movements"] = snapshot["recent_movements"]
 
-        low_items = InventoryItem.objects.filter(quantity__lte=F("reorder_level"))
-        context["low_stock_count"] = low_items.count()
-        context["low_stock_items"] = low_items[:50]
-
-        recent = StockMovement.objects.select_related("item").order_by("-timestamp")[:10]
-        context["recent_movements"] = recent
-
-        context["daily_movements"] = count_moves(today)
-        context["weekly_movements"] = count_moves(start_week)
-        context["monthly_movements"] = count_moves(start_month)
-        context["yearly_movements"] = count_moves(start_year)
+        context["daily_movements"] = counts["daily"]
+        context["weekly_movements"] = counts["weekly"]
+        context["monthly_movements"] = counts["monthly"]
+        context["yearly_movements"] = counts["yearly"]
 
         role = get_user_role(self.request.user)
         context["role"] = role
@@ -315,3 +546,99 @@ class InventoryDashboardPage(LoginRequiredMixin, TemplateView):
         context["show_analytics"] = role in ["SUPERVISOR", "MANAGER", "ADMIN"]
 
         return context
+
+
+class StockStreamView(View):
+    """
+    Server-sent events of committed stock movements. Serve it through asgi.py so idle
+    connections only hold a coroutine. ?item=1,2 and ?category=RAW,FG narrow the stream;
+    a reconnecting client's Last-Event-ID replays what it missed. Delivery is at least once:
+    ids are taken before commit, so a replay also resends the replay_overlap before Last-Event-ID
+    to catch rows that committed after a higher id, and clients drop ids they already have.
+    """
+
+    heartbeat = 15
+    replay_limit = 1000
+    replay_overlap = timedelta(seconds=30)
+
+    async def get(self, request):
+        if await self.authenticate(request) is None:
+            return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+        try:
+            items = self.split(request.GET.get("item"), int)
+            last_id = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id")
+            last_id = int(last_id) if last_id else None
+        except ValueError:
+            return JsonResponse({"detail": "item and Last-Event-ID must be integers"}, status=400)
+        categories = self.split(request.GET.get("category"), str.upper)
+
+        response = StreamingHttpResponse(self.stream(items, categories, last_id), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    @staticmethod
+    def split(value, cast):
+        return [cast(part.strip()) for part in value.split(",") if part.strip()] if value else []
+
+    async def authenticate(self, request):
+        user = await request.auser()
+        if user.is_authenticated:
+            return user
+        try:
+            result = await sync_to_async(JWTAuthentication().authenticate)(request)
+        except AuthenticationFailed:
+            return None
+        return result[0] if result else None
+
+    def replay(self, items, categories, after_id, up_to=None, since=None):
+        """The next replay_limit movements after after_id, oldest first, optionally up to id up_to and written since since."""
+        moves = StockMovement.objects.filter(id__gt=after_id)
+        if up_to is not None:
+            moves = moves.filter(id__lte=up_to, timestamp__gte=since)
+        if items or categories:
+            moves = moves.filter(Q(item_id__in=items) | Q(item__category__in=categories))
+        moves = moves.select_related("item").order_by("id")[:self.replay_limit]
+        return [movement_event(move, move.item.category) for move in moves]
+
+    def replay_ranges(self, last_id):
+        """(after_id, up_to, since) of the overlap before last_id, then of everything after it."""
+        stamp = StockMovement.objects.filter(id=last_id).values_list("timestamp", flat=True).first()
+        overlap = [] if stamp is None else [(0, last_id, stamp - self.replay_overlap)]
+        return overlap + [(last_id, None, None)]
+
+    @staticmethod
+    def format(event):
+        return f"id: {event['id']}\nevent: movement\ndata: {json.dumps(event)}\n\n"
+
+    async def stream(self, items, categories, last_id):
+        # subscribe before replaying so nothing committed in between is lost
+        subscription = broker.subscribe(items, categories)
+        try:
+            yield "retry: 5000\n\n"
+            replayed = set()
+            ranges = await sync_to_async(self.replay_ranges)(last_id) if last_id is not None else []
+            # page through each range until a short page, the subscription holds what commits meanwhile
+            for after_id, up_to, since in ranges:
+                while after_id is not None:
+                    events = await sync_to_async(self.replay)(items, categories, after_id, up_to, since)
+                    for event in events:
+                        replayed.add(event["id"])
+                        yield self.format(event)
+                    after_id = events[-1]["id"] if len(events) == self.replay_limit else None
+            newest_replayed = max(replayed, default=0)
+            while not subscription.overflowed:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if event["id"] in replayed:
+                    replayed.discard(event["id"])
+                    continue
+                # live events have moved past the replay, stop remembering it
+                if event["id"] > newest_replayed:
+                    replayed.clear()
+                yield self.format(event)
+        finally:
+            broker.unsubscribe(subscription)
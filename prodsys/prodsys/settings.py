@@ -17,6 +17,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
 
     # Third-party
     "rest_framework",
@@ -74,6 +75,23 @@ DATABASES = {
     }
 }
 
+# Point this at a shared cache (Redis, Memcached) when running several workers,
+# otherwise each process keeps its own dashboard snapshot.
+CACHES = {
+    "default": {
+        "BACKEND": config("CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": config("CACHE_LOCATION", default=""),
+    }
+}
+
+# Stored Idempotency-Key responses are replayed for this long, purge_idempotency_keys removes older ones
+IDEMPOTENCY_KEY_TTL_HOURS = config("IDEMPOTENCY_KEY_TTL_HOURS", default=24, cast=int)
+
+# Partition inventory_stockmovement by month (PostgreSQL). Read when the inventory migrations run;
+# partition_stock_movements keeps this many months created ahead
+STOCK_MOVEMENT_PARTITIONING = config("STOCK_MOVEMENT_PARTITIONING", default=False, cast=bool)
+STOCK_MOVEMENT_PARTITIONS_AHEAD = config("STOCK_MOVEMENT_PARTITIONS_AHEAD", default=3, cast=int)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
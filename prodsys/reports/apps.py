@@ -6,4 +6,4 @@ class ReportsConfig(AppConfig):
     name = "reports"
 
     def ready(self):
-        import reports.signals  # noqa
+        import reports.handlers  # noqa
@@ -0,0 +1,60 @@
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+
+from core import domain
+from inventory.ledger import record_batch, LedgerError
+from inventory.models import BomRequirement
+from production.models import MaterialConsumption
+
+from .models import ReportAuditTrail
+
+CENT = Decimal("0.01")
+
+
+@domain.invariant("production_reports.approved")
+def consume_materials(reports, user):
+    """
+    Book the production of every approved report: the flattened BOM of its finished item times
+    quantity_produced goes out of stock, the finished item comes in, all in one locked batch.
+    """
+    per_unit = defaultdict(list)
+    rows = BomRequirement.objects.filter(finished_item__in={report.finished_item_id for report in reports})
+    for finished_id, raw_id, uom, quantity in rows.values_list("finished_item", "raw_item", "raw_item__uom", "quantity_per_unit"):
+        per_unit[finished_id].append((raw_id, uom, quantity))
+
+    lines = []
+    consumptions = []
+    for report in reports:
+        reference = f"Report {report.pk}"
+        for raw_id, uom, quantity in per_unit[report.finished_item_id]:
+            needed = (quantity * report.quantity_produced).quantize(CENT, ROUND_HALF_UP)
+            if needed <= 0:
+                continue
+            lines.append({"item": raw_id, "movement_type": "OUT", "quantity": needed, "reference": reference, "remarks": "Consumed by production"})
+            # bulk_create, MaterialConsumption.save() would take the stock out a second time
+            consumptions.append(MaterialConsumption(report=report, material_id=raw_id, quantity_used=needed, unit=uom))
+        if report.quantity_produced > 0:
+            lines.append({"item": report.finished_item_id, "movement_type": "IN", "quantity": report.quantity_produced, "reference": reference, "remarks": "Finished goods from production"})
+
+    _, errors = record_batch(lines, user=user, atomic=True)
+    if errors:
+        raise LedgerError("Cannot approve: " + "; ".join(error["error"] for error in errors))
+    MaterialConsumption.objects.bulk_create(consumptions, batch_size=1000)
+
+
+def _audit(change_type):
+    def write(reports, user):
+        ReportAuditTrail.objects.bulk_create(
+            [ReportAuditTrail(report=report, changed_by=user, change_type=change_type) for report in reports],
+            batch_size=1000,
+        )
+    return write
+
+
+for event, change_type in {
+    "production_reports.created": ReportAuditTrail.ChangeType.CREATE,
+    "production_reports.updated": ReportAuditTrail.ChangeType.UPDATE,
+    "production_reports.approved": ReportAuditTrail.ChangeType.APPROVE,
+    "production_reports.deleted": ReportAuditTrail.ChangeType.DELETE,
+}.items():
+    domain.follow_up(event)(_audit(change_type))
@@ -3,8 +3,9 @@ from rest_framework.exceptions import ValidationError
 from .models import ProductionReport, ReportAuditTrail
 from production.models import Machine, Section, MaterialConsumption
 from production.serializers import MachineSerializer, SectionSerializer
+from core.serializers import DynamicFieldsMixin
 
-class ProductionReportSerializer(serializers.ModelSerializer):
+class ProductionReportSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     net_output = serializers.ReadOnlyField()
     efficiency = serializers.ReadOnlyField()
 
@@ -38,6 +39,7 @@ class ProductionReportSerializer(serializers.ModelSerializer):
             "efficiency",
         ]
         read_only_fields = ["created_at", "waste", "net_output", "efficiency"]
+        nested_fields = ["machine", "section"]
 
     def create(self, validated_data):
         validated_data["user"] = self.context["request"].user
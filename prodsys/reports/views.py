@@ -15,6 +15,9 @@ from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.exceptions import ValidationError
 
 from accounts.permissions import ReportPermission
+from core import domain
+from core.idempotency import IdempotentMixin
+from inventory.ledger import LedgerError
 from .models import ProductionReport, ReportAuditTrail
 from .serializers import ProductionReportSerializer, ReportAuditTrailSerializer
 from .filters import ProductionReportFilter
@@ -40,7 +43,7 @@ class IsAdminOrReportPermission(permissions.BasePermission):
             return True
         return ReportPermission().has_object_permission(request, view, obj)
 
-class ProductionReportViewSet(viewsets.ModelViewSet):
+class ProductionReportViewSet(IdempotentMixin, viewsets.ModelViewSet):
     queryset = ProductionReport.objects.select_related("machine", "section", "user").all()
     serializer_class = ProductionReportSerializer
     permission_classes = [IsAdminOrReportPermission]
@@ -58,40 +61,51 @@ class ProductionReportViewSet(viewsets.ModelViewSet):
             report = serializer.save(user=self.request.user, section=machine.section)
         else:
             report = serializer.save(user=self.request.user)
-        ReportAuditTrail.objects.create(report=report, changed_by=self.request.user,
-                                        change_type=ReportAuditTrail.ChangeType.CREATE)
+        domain.dispatch("production_reports.created", reports=[report], user=self.request.user)
 
     def perform_update(self, serializer):
         report = self.get_object()
         if report.status == ProductionReport.Status.APPROVED:
             raise ValidationError("Cannot modify approved report")
+        if serializer.validated_data.get("status") == ProductionReport.Status.APPROVED:
+            raise ValidationError({"status": "Use the approve action to approve a report"})
         machine = serializer.validated_data.get("machine")
         section = serializer.validated_data.get("section")
         if machine and not section:
             report = serializer.save(section=machine.section)
         else:
             report = serializer.save()
-        ReportAuditTrail.objects.create(report=report, changed_by=self.request.user,
-                                        change_type=ReportAuditTrail.ChangeType.UPDATE)
+        domain.dispatch("production_reports.updated", reports=[report], user=self.request.user)
 
     def destroy(self, request, *args, **kwargs):
         report = self.get_object()
         if report.status == ProductionReport.Status.APPROVED:
             return Response({"error": "Cannot delete approved report"}, status=status.HTTP_400_BAD_REQUEST)
-        report._deleted_by = request.user
         return super().destroy(request, *args, **kwargs)
 
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            domain.dispatch("production_reports.deleted", reports=[instance], user=self.request.user)
+
     @action(detail=True, methods=["post"])
     def approve(self, request, pk=None):
         report = self.get_object()
         if report.status == ProductionReport.Status.APPROVED:
             return Response({"detail": "Report already approved"}, status=status.HTTP_400_BAD_REQUEST)
-        with transaction.atomic():
-            report.status = ProductionReport.Status.APPROVED
-            report.approved_at = now()
-            report.save()
-            ReportAuditTrail.objects.create(report=report, changed_by=request.user,
-                                            change_type=ReportAuditTrail.ChangeType.APPROVE)
+        stamp = now()
+        try:
+            with transaction.atomic():
+                # the status guard makes a concurrent second approval a no-op instead of a second deduction
+                approved = (
+                    ProductionReport.objects.filter(pk=report.pk).exclude(status=ProductionReport.Status.APPROVED)
+                    .update(status=ProductionReport.Status.APPROVED, approved_at=stamp, updated_at=stamp)
+                )
+                if not approved:
+                    return Response({"detail": "Report already approved"}, status=status.HTTP_400_BAD_REQUEST)
+                domain.dispatch("production_reports.approved", reports=[report], user=request.user)
+        except LedgerError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         return Response({"status": "approved"}, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=["get"])
@@ -122,7 +136,7 @@ class ProductionReportViewSet(viewsets.ModelViewSet):
             return Response({"error": "No file uploaded"}, status=status.HTTP_400_BAD_REQUEST)
         decoded_file = file_obj.read().decode("utf-8")
         reader = csv.DictReader(io.StringIO(decoded_file))
-        created_reports, errors = [], []
+        created_reports, created, errors = [], [], []
         for idx, row in enumerate(reader, start=1):
             try:
                 machine_name = row.get("Machine")
@@ -142,13 +156,12 @@ class ProductionReportViewSet(viewsets.ModelViewSet):
                 }
                 serializer = self.get_serializer(data=data)
                 serializer.is_valid(raise_exception=True)
-                with transaction.atomic():
-                    report = serializer.save(user=request.user)
-                    ReportAuditTrail.objects.create(report=report, changed_by=request.user,
-                                                    change_type=ReportAuditTrail.ChangeType.CREATE)
+                report = serializer.save(user=request.user)
                 created_reports.append(serializer.data)
+                created.append(report)
             except Exception as e:
                 errors.append({"row": idx, "error": str(e), "data": row})
+        domain.dispatch("production_reports.created", reports=created, user=request.user)
         return Response({"created": created_reports, "errors": errors},
                         status=status.HTTP_201_CREATED if created_reports else status.HTTP_400_BAD_REQUEST)
 
@@ -207,8 +220,7 @@ class ProductionReportViewSet(viewsets.ModelViewSet):
             for data in preview_data:
                 report = ProductionReport.objects.create(user=request.user, **data)
                 created_reports.append(report)
-                ReportAuditTrail.objects.create(report=report, changed_by=request.user,
-                                                change_type=ReportAuditTrail.ChangeType.CREATE)
+            domain.dispatch("production_reports.created", reports=created_reports, user=request.user)
         cache.delete(f"csv_preview_{preview_id}")
         return Response({"created": ProductionReportSerializer(created_reports, many=True).data},
                         status=status.HTTP_201_CREATED)
@@ -220,7 +232,8 @@ class ProductionReportViewSet(viewsets.ModelViewSet):
         cons_data = MaterialConsumptionSerializer(consumptions, many=True).data
         moves_data = []
         if StockMovement and StockMovementSerializer:
-            moves = StockMovement.objects.filter(reference__icontains=f"Report {report.id}")
+            # nothing is booked for a report before it exists, the bound lets a partitioned ledger skip older months
+            moves = StockMovement.objects.filter(reference__icontains=f"Report {report.id}", timestamp__gte=report.created_at)
             moves_data = StockMovementSerializer(moves, many=True).data
         return Response({
             "report_id": report.id,